@@ -1,26 +1,126 @@
-from github.MainClass import Github
-from typing import List
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+import requests
+
+from apis.rateLimiter import github_rate_limiter, parse_retry_after
+from helpers.cache import api_cache, cache_key
+from helpers.metrics import run_metrics
+
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+GITHUB_MEMBERSHIP_CACHE = 'github-org-membership'
+# Cached memberships are only used to send If-None-Match, GitHub still confirms each one
+GITHUB_MEMBERSHIP_CACHE_TTL = 7 * 24 * 3600
+DEFAULT_GITHUB_CONCURRENCY = 10
 
 def list_organizations(github_token: str) -> List[dict]:
     try:
+        # PyGithub is only needed to list every org, so it is loaded here instead of at import time
+        from github.MainClass import Github
+
         # Initialize the GitHub client
-        github_client = Github(github_token)
+        github_client = Github(github_token, base_url=GITHUB_API_URL)
         
         # Get authenticated user's organizations
         orgs = github_client.get_user().get_orgs()
         
-        # Convert organization objects to dictionaries
-        org_list = [
-            {
-                'id': org.id,
-                'name': org.name,  # Full/display name of the organization
-                'login': org.login,  # Organization's username/login
-                'url': org.html_url
-            }
-            for org in orgs
-        ]
+        # Convert organization objects to dictionaries.  Pages are fetched one request at a time through
+        # the shared rate limiter, which pauses when GitHub reports the limit is used up.
+        org_list = []
+        page_number = 0
+        while True:
+            with github_rate_limiter.slot():
+                started = time.monotonic()
+                page = orgs.get_page(page_number)
+            run_metrics.observe_http('GET', '/user/orgs', 200, time.monotonic() - started)
+            remaining, _ = github_client.rate_limiting
+            github_rate_limiter.update_remaining(remaining, github_client.rate_limiting_resettime)
+            if not page:
+                break
+
+            org_list.extend(
+                {
+                    'id': org.id,
+                    'name': org.name,  # Full/display name of the organization
+                    'login': org.login,  # Organization's username/login
+                    'url': org.html_url
+                }
+                for org in page
+            )
+            page_number += 1
         
         return org_list
         
     except Exception as e:
-        raise Exception(f"Failed to fetch organizations: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to fetch organizations: {str(e)}") 
+
+# Check whether the token's user is an active member of one org.  The last answer is cached with its ETag
+# so repeated checks are conditional requests, which GitHub answers with a 304 that doesn't count against
+# the rate limit.
+def get_organization_membership(session: requests.Session, github_org_name: str) -> dict | None:
+    url = f'{GITHUB_API_URL}/user/memberships/orgs/{github_org_name}'
+    key = cache_key(GITHUB_API_URL, github_org_name.lower())
+    found, cached = api_cache.get(GITHUB_MEMBERSHIP_CACHE, key)
+    headers = {'If-None-Match': cached['etag']} if found and cached.get('etag') else {}
+
+    max_retries = github_rate_limiter.max_retries
+    for attempt in range(max_retries + 1):
+        with github_rate_limiter.slot():
+            started = time.monotonic()
+            response = session.get(url, headers=headers, timeout=30)
+        # One series for every org, the org name stays out of the label
+        run_metrics.observe_http('GET', '/user/memberships/orgs/{org}', response.status_code, time.monotonic() - started)
+        # A 429, or the limit being used up, pauses the shared limiter so the retry waits for the reset
+        github_rate_limiter.update_from_response(response.status_code, response.headers, attempt)
+        # GitHub reports secondary rate limits as a 403 with Retry-After
+        secondary_limit = response.status_code == 403 and (parse_retry_after(response.headers) is not None or response.headers.get('X-RateLimit-Remaining') == '0')
+        if attempt == max_retries or not (secondary_limit or github_rate_limiter.should_retry(response.status_code)):
+            break
+        if secondary_limit:
+            github_rate_limiter.block_for(github_rate_limiter.backoff_delay(attempt, parse_retry_after(response.headers)))
+        elif response.status_code != 429:
+            time.sleep(github_rate_limiter.backoff_delay(attempt))
+
+    if response.status_code == 304 and found:
+        return cached['org']
+    if response.status_code == 404:
+        api_cache.invalidate(GITHUB_MEMBERSHIP_CACHE, key)
+        return None
+    # A 403 is not a missing org: the token lacks the read:org scope, is not authorized for the org's SAML
+    # SSO, or the secondary rate limit outlasted the retries.  Skipping the row would hide that.
+    if response.status_code == 403:
+        message = response.json().get('message', '') if response.content else ''
+        raise Exception(f"GitHub denied access to the membership of org {github_org_name} (403 {message}).  The token needs the read:org scope and, for orgs using SAML SSO, to be authorized for the org.")
+    response.raise_for_status()
+
+    membership = response.json()
+    if membership.get('state') != 'active':
+        return None
+    organization = membership['organization']
+    org = {
+        'id': organization['id'],
+        'name': organization.get('name'),
+        'login': organization['login'],
+        'url': organization.get('html_url', f"https://github.com/{organization['login']}")
+    }
+    api_cache.set(GITHUB_MEMBERSHIP_CACHE, key, {'etag': response.headers.get('ETag'), 'org': org}, GITHUB_MEMBERSHIP_CACHE_TTL)
+    return org
+
+# Resolve only the named orgs instead of listing every org the token belongs to.  Returns the orgs the
+# token is a member of, keyed by the name they were asked for.
+def resolve_organizations(github_token: str, github_org_names: Iterable[str], concurrency: int = DEFAULT_GITHUB_CONCURRENCY) -> Dict[str, dict]:
+    github_org_names = list(dict.fromkeys(github_org_names))
+    if not github_org_names:
+        return {}
+
+    try:
+        with requests.Session() as session:
+            session.headers['Authorization'] = f'Bearer {github_token}'
+            session.headers['Accept'] = 'application/vnd.github+json'
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                orgs = executor.map(lambda name: get_organization_membership(session, name), github_org_names)
+                return {name: org for name, org in zip(github_org_names, orgs) if org is not None}
+    except Exception as e:
+        raise Exception(f"Failed to resolve organizations: {str(e)}")
@@ -0,0 +1,165 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+
+class RateLimiter:
+    """
+    Token bucket shared by every request to one API.  Requests wait for a token before they are sent,
+    a 429 or an exhausted rate-limit header pauses every caller until the limit resets, and the refill
+    rate backs off after throttling and creeps back up while requests succeed.
+    """
+
+    def __init__(self, name: str, requests_per_second: float, burst: int | None = None, max_retries: int = 5, base_delay: float = 1, max_delay: float = 60):
+        self.name = name
+        self.max_rate = requests_per_second
+        self.rate = requests_per_second
+        self.min_rate = max(requests_per_second / 20, 0.1)
+        self.burst = burst or max(1, int(requests_per_second))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.throttled_requests = 0
+
+    def configure(self, requests_per_second: float, burst: int | None = None) -> None:
+        with self._lock:
+            self.max_rate = requests_per_second
+            self.rate = requests_per_second
+            self.min_rate = max(requests_per_second / 20, 0.1)
+            self.burst = burst or max(1, int(requests_per_second))
+            self._tokens = min(self._tokens, float(self.burst))
+
+    # Take a token and return how long the caller has to wait before sending its request
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def _start(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.total_requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _finish(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def slot(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        self._start()
+        try:
+            yield
+        finally:
+            self._finish()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._start()
+        try:
+            yield
+        finally:
+            self._finish()
+
+    # Jittered exponential backoff, or the server's Retry-After plus a little jitter when it sent one
+    def backoff_delay(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def should_retry(self, status_code: int) -> bool:
+        return status_code == 429 or status_code >= 500
+
+    # Pause every caller until the given number of seconds has passed
+    def block_for(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_remaining(self, remaining: int | None, reset_epoch: float | None) -> None:
+        if remaining is not None and remaining <= 0 and reset_epoch:
+            self.block_for(max(0.0, reset_epoch - time.time()))
+
+    # Feed a response back into the scheduler.  Returns the delay before the request should be retried
+    # when it was throttled, otherwise None.
+    def update_from_response(self, status_code: int, headers, attempt: int = 0) -> float | None:
+        remaining = parse_int_header(headers, 'X-RateLimit-Remaining')
+        reset = parse_int_header(headers, 'X-RateLimit-Reset')
+        # GitHub sends the reset as an epoch timestamp, Snyk as seconds until reset
+        if reset is not None and reset < 10 ** 9:
+            reset = time.time() + reset
+        self.update_remaining(remaining, reset)
+
+        if status_code != 429:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+            return None
+
+        with self._lock:
+            self.throttled_requests += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+        delay = self.backoff_delay(attempt, parse_retry_after(headers))
+        self.block_for(delay)
+        print(f"{self.name} rate limit exceeded.  Pausing requests for {delay:.1f} seconds.")
+        return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'total_requests': self.total_requests,
+                'throttled_requests': self.throttled_requests,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'current_rate': round(self.rate, 2),
+            }
+
+    def describe(self) -> str:
+        stats = self.stats()
+        return f"{self.name} API: {stats['total_requests']} requests, {stats['throttled_requests']} throttled, {stats['in_flight']} in flight, peak {stats['peak_in_flight']} in flight"
+
+def parse_int_header(headers, name: str) -> int | None:
+    value = headers.get(name) if headers is not None else None
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+# Retry-After is either a number of seconds or an HTTP date
+def parse_retry_after(headers) -> float | None:
+    value = headers.get('Retry-After') if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Snyk allows roughly 1620 REST requests per minute per token, GitHub 5000 per hour with bursts allowed
+snyk_rate_limiter = RateLimiter('Snyk', requests_per_second=25)
+github_rate_limiter = RateLimiter('GitHub', requests_per_second=10)
@@ -1,93 +1,136 @@
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Iterator
+from urllib.parse import urljoin
 import requests
 from requests.exceptions import HTTPError
-import time
 
+from apis.snykClient import SnykClient
+from helpers.cache import api_cache, cache_key
 from helpers.helper import get_snyk_token
 
-SNYK_TOKEN = get_snyk_token()
-
-restHeaders = {'Content-Type': 'application/vnd.api+json', 'Authorization': f'token {SNYK_TOKEN}'}
-v1Headers = {'Content-Type': 'application/json; charset=utf-8', 'Authorization': f'token {SNYK_TOKEN}'}
+# The Snyk client sends the Authorization header itself, so the token is only read when the first
+# request is made and importing this module never needs SNYK_TOKEN
+restHeaders = {'Content-Type': 'application/vnd.api+json'}
+v1Headers = {'Content-Type': 'application/json; charset=utf-8'}
 rest_version = '2024-10-15'
 
+SNYK_ORGS_CACHE = 'snyk-orgs'
+ORG_INTEGRATIONS_CACHE = 'org-integrations'
+SNYK_TARGETS_CACHE = 'snyk-targets'
+
+# Send every Snyk call to another host instead of the tenant, for example a proxy or the local API
+# stand-in the benchmarks run against
+SNYK_API_BASE_URL = os.environ.get('SNYK_API_BASE_URL')
+
+def snyk_base_url(snyk_api_tenant):
+    return SNYK_API_BASE_URL.rstrip('/') if SNYK_API_BASE_URL else f'https://{snyk_api_tenant}'
+
+_snyk_client = None
+_snyk_client_lock = threading.Lock()
+
+# Shared pooled client used for every Snyk API call, created with the token on first use
+def get_snyk_client() -> SnykClient:
+    global _snyk_client
+    with _snyk_client_lock:
+        if _snyk_client is None:
+            _snyk_client = SnykClient(get_snyk_token())
+        return _snyk_client
+
+# Configure the shared Snyk client's connection pool, timeout and keep-alive
+def configure_snyk_client(pool_size: int, timeout: float, keep_alive: bool = True):
+    get_snyk_client().configure(pool_size, timeout, keep_alive)
+
 # Create a request method
 def create_request_method(method):
+    snyk_client = get_snyk_client()
     methods = {
-        'GET': requests.get,
-        'POST': requests.post,
-        'PUT': requests.put,
-        'DELETE': requests.delete,
-        'PATCH': requests.patch,
+        'GET': partial(snyk_client.request, 'GET'),
+        'POST': partial(snyk_client.request, 'POST'),
+        'PUT': partial(snyk_client.request, 'PUT'),
+        'DELETE': partial(snyk_client.request, 'DELETE'),
+        'PATCH': partial(snyk_client.request, 'PATCH'),
     }
 
     http_method = methods.get(method.upper())
     
     return http_method
 
-# Paginate through Snyk's API endpoints with retry and backoff
+# Fetch and parse one REST page.  Returns its data and the absolute URL of the next page, resolved
+# against the page's own URL so every page comes from the tenant (or base URL) the listing started on.
+def fetch_rest_page(url, headers=restHeaders) -> tuple[list, str | None]:
+    api_response = get_snyk_client().get(url, headers=headers)
+    api_response.raise_for_status()
+    page = api_response.json()
+    next_link = (page.get('links') or {}).get('next')
+    return (page.get('data', []), urljoin(url, next_link) if next_link else None)
+
+# Yield the data of each page of a REST listing.  Page N+1 is requested in the background as soon as
+# page N has been parsed, so its round trip overlaps with the caller processing page N.
+def iter_rest_pages(url, headers=restHeaders) -> Iterator[list]:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(fetch_rest_page, url, headers)
+        while next_page is not None:
+            data, next_url = next_page.result()
+            next_page = executor.submit(fetch_rest_page, next_url, headers) if next_url else None
+            yield data
+
+def paginate_rest(url, headers=restHeaders) -> list:
+    data = []
+    for page_data in iter_rest_pages(url, headers):
+        data.extend(page_data)
+    return data
+
+# Paginate through Snyk's API endpoints.  Retries, backoff and 429 handling happen in the shared
+# client, so a response that still fails here is raised.
 def pagination_snyk_rest_endpoint(method, url, *args):
-    retries = 3
-    delay = 5
     http_method = create_request_method(method)
     if any(args):
-        for attempt in range(retries):
-            try:
-                api_response = http_method(url, headers=restHeaders, data=json.dumps(args[0]))
-                api_response.raise_for_status()
-                return api_response
-            except requests.RequestException as e:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < retries - 1:
-                    time.sleep(delay)
-                else:
-                    print("All attempts failed.")
-                    raise
+        try:
+            api_response = http_method(url, headers=restHeaders, data=json.dumps(args[0]))
+            api_response.raise_for_status()
+            return api_response
+        except requests.RequestException as e:
+            print(f"All attempts failed: {e}")
+            raise
+    elif method.upper() == 'GET':
+        try:
+            return paginate_rest(url)
+        except requests.RequestException as e:
+            print(f"All attempts failed: {e}")
+            raise
     else:
-        has_next_link = True
-        data = []
-        while has_next_link:
-            for attempt in range(retries):
-                try:
-                    api_response = http_method(url, headers=restHeaders)
-                    api_data = api_response.json()['data']
-                    data.extend(api_data)
-                    # If the response status is 429, handle the rate limit
-                    if api_response.status_code == 429:
-                        print(f"Rate limit exceeded. Waiting for 60 seconds.")
-                        time.sleep(61)
-                        continue
-                except requests.RequestException as e:
-                    print(f"Attempt {attempt + 1} failed: {e}")
-                    if attempt < retries - 1:
-                        time.sleep(delay)
-                    else:
-                        print("All attempts failed.")
-                        raise
-                
-                # Check if next page exist and set url if it does.  If not, exit and return issuesData
-                try:
-                    api_response.json()['links']['next']
-                    url = 'https://api.us.snyk.io' + api_response.json()['links']['next']
-                except:
-                    has_next_link = False
-                    return data
-                
+        raise ValueError(f"Only GET listings can be paginated, got {method}")
 
 def get_org_integrations(orgId, snyk_api_tenant, orgName = 'No Name provided'):
     # print(f"Collecting organization integrations for {orgName}")
-    url = f'https://{snyk_api_tenant}/v1/org/{orgId}/integrations'
+    url = f'{snyk_base_url(snyk_api_tenant)}/v1/org/{orgId}/integrations'
+
+    found, integrations = api_cache.get(ORG_INTEGRATIONS_CACHE, cache_key(snyk_api_tenant, orgId))
+    if found:
+        return integrations
 
     try:
-        integrationsApiResponse = requests.get(url, headers=v1Headers)
-        return integrationsApiResponse.json()
+        integrationsApiResponse = get_snyk_client().get(url, headers=v1Headers)
+        integrations = integrationsApiResponse.json()
+        cache_org_integrations(orgId, snyk_api_tenant, integrations)
+        return integrations
     except HTTPError as exc:
         # Raise an error
         print("Snyk Integrations endpoint failed.")
         print(exc)
 
+# Only cache lookups that returned integrations.  A freshly created org gets its integrations copied
+# from the source org shortly after creation, so an empty answer must not stick.
+def cache_org_integrations(org_id, snyk_api_tenant, integrations):
+    if isinstance(integrations, dict) and integrations and 'code' not in integrations:
+        api_cache.set(ORG_INTEGRATIONS_CACHE, cache_key(snyk_api_tenant, org_id), integrations)
+
 def create_snyk_org(org_data, source_org_id, index, group_id, snyk_api_tenant = 'api.us.snyk.io'):
-    url = f'https://{snyk_api_tenant}/v1/org'
+    url = f'{snyk_base_url(snyk_api_tenant)}/v1/org'
     body = {
         "name": org_data['attributes']['name'] + '-' + str(index),
         "groupId": group_id,
@@ -95,39 +138,36 @@ def create_snyk_org(org_data, source_org_id, index, group_id, snyk_api_tenant =
     }
     
     try:
-        orgApiResponse = requests.post(url, headers=v1Headers, data=json.dumps(body))
+        orgApiResponse = get_snyk_client().post(url, headers=v1Headers, data=json.dumps(body))
+        # The group's org list no longer matches what is cached
+        api_cache.invalidate(SNYK_ORGS_CACHE, cache_key(snyk_api_tenant, group_id))
         return orgApiResponse.json()
     except HTTPError as exc:
         print(f"Snyk Org creation failed.  Error: {exc}")
 
 def get_snyk_orgs(groupId, snyk_api_tenant = 'api.us.snyk.io'):
+    found, orgs = api_cache.get(SNYK_ORGS_CACHE, cache_key(snyk_api_tenant, groupId))
+    if found:
+        return orgs
+
     print("Collecting organization IDs")
-    url = f'https://{snyk_api_tenant}/rest/groups/{groupId}/orgs?version={rest_version}&limit=100'
-    hasNextLink = True
-    orgs = []
+    url = f'{snyk_base_url(snyk_api_tenant)}/rest/groups/{groupId}/orgs?version={rest_version}&limit=100'
 
-    while hasNextLink:
-        try:
-            orgApiResponse = requests.get(url, headers=restHeaders)
-            orgData = orgApiResponse.json()['data']
-            orgs.extend(orgData)
-        except:
-            print("Orgs endpoint call failed.")
-            print(orgApiResponse)
-        
-        # Check if next page exist and set url if it does.  If not, exit and return issuesData
-        try:
-            orgApiResponse.json()['links']['next']
-            url = 'https://api.us.snyk.io' + orgApiResponse.json()['links']['next']
-        except:
-            hasNextLink = False
-            return orgs
+    try:
+        orgs = paginate_rest(url)
+    except requests.RequestException as e:
+        print("Orgs endpoint call failed.")
+        print(e)
+        raise
+
+    api_cache.set(SNYK_ORGS_CACHE, cache_key(snyk_api_tenant, groupId), orgs)
+    return orgs
 
 def get_snyk_org_data(org_id, snyk_api_tenant):
-    url = f'https://{snyk_api_tenant}/rest/orgs/{org_id}?version={rest_version}'
+    url = f'{snyk_base_url(snyk_api_tenant)}/rest/orgs/{org_id}?version={rest_version}'
     
     try:
-        org_data_api_response = requests.get(url, headers=restHeaders)
+        org_data_api_response = get_snyk_client().get(url, headers=restHeaders)
         org_data = org_data_api_response.json()['data']
         return org_data
     except:
@@ -136,8 +176,17 @@ def get_snyk_org_data(org_id, snyk_api_tenant):
         
 # Get all snyk targets in org.
 def get_snyk_targets(org_id, snyk_api_tenant = 'api.us.snyk.io'):
-    url = f'https://{snyk_api_tenant}/rest/orgs/{org_id}/targets?version={rest_version}&limit=100'
+    found, target_data = api_cache.get(SNYK_TARGETS_CACHE, cache_key(snyk_api_tenant, org_id))
+    if found:
+        return target_data
+
+    url = f'{snyk_base_url(snyk_api_tenant)}/rest/orgs/{org_id}/targets?version={rest_version}&limit=100'
     
     target_data = pagination_snyk_rest_endpoint('GET', url)
+    api_cache.set(SNYK_TARGETS_CACHE, cache_key(snyk_api_tenant, org_id), target_data)
     
-    return target_data
\ No newline at end of file
+    return target_data
+
+# Drop an org's cached targets once new ones have been imported into it
+def invalidate_snyk_targets(org_id, snyk_api_tenant = 'api.us.snyk.io'):
+    api_cache.invalidate(SNYK_TARGETS_CACHE, cache_key(snyk_api_tenant, org_id))
@@ -0,0 +1,185 @@
+import asyncio
+import atexit
+import threading
+import time
+from typing import AsyncIterator, Dict, List
+from urllib.parse import urljoin
+
+import aiohttp
+
+from apis.rateLimiter import snyk_rate_limiter
+from apis.snykApi import ORG_INTEGRATIONS_CACHE, SNYK_ORGS_CACHE, cache_org_integrations, get_snyk_client, restHeaders, rest_version, snyk_base_url, v1Headers
+from helpers.cache import api_cache, cache_key
+from helpers.metrics import endpoint_label, run_metrics
+
+DEFAULT_CONCURRENCY = 20
+
+class AsyncSnykClient:
+    """
+    asyncio based Snyk client.  Requests share one aiohttp session, sized and timed out like the shared
+    sync client, and the shared rate limiter paces them, so lookups for many orgs can be fanned out
+    without flooding the tenant.  One client per tenant lives on the background event loop for the
+    whole run, so its connections stay warm between chunks of lookups and between watch cycles.
+    """
+
+    def __init__(self, snyk_api_tenant: str = 'api.us.snyk.io'):
+        self.snyk_api_tenant = snyk_api_tenant
+        self.base_url = snyk_base_url(snyk_api_tenant)
+        self.session = None
+        self.settings = None
+
+    # Open the session, or reopen it when the sync client's pool size, timeout or keep-alive changed.
+    # Runs on the event loop.  The sync client is passed in so the token is read on the calling thread.
+    async def open(self, snyk_client) -> None:
+        settings = (snyk_client.pool_size, snyk_client.timeout, snyk_client.keep_alive)
+        if self.session is not None and settings == self.settings:
+            return
+        await self.close()
+        pool_size, timeout, keep_alive = settings
+        connector = aiohttp.TCPConnector(limit=pool_size, force_close=not keep_alive)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout), headers={'Authorization': f'token {snyk_client.snyk_token}'})
+        self.settings = settings
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, url: str, headers: dict) -> dict:
+        max_retries = snyk_rate_limiter.max_retries
+        endpoint = endpoint_label(url)
+        for attempt in range(max_retries + 1):
+            try:
+                async with snyk_rate_limiter.async_slot():
+                    started = time.monotonic()
+                    async with self.session.get(url, headers=headers) as response:
+                        run_metrics.observe_http('GET', endpoint, response.status, time.monotonic() - started)
+                        # A 429 pauses the shared limiter, so the retry waits for the limit to reset
+                        snyk_rate_limiter.update_from_response(response.status, response.headers, attempt)
+                        if snyk_rate_limiter.should_retry(response.status) and attempt < max_retries:
+                            retry_delay = 0 if response.status == 429 else snyk_rate_limiter.backoff_delay(attempt)
+                        else:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                run_metrics.observe_http('GET', endpoint, 'error', time.monotonic() - started)
+                if attempt == max_retries:
+                    raise
+                retry_delay = snyk_rate_limiter.backoff_delay(attempt)
+            await asyncio.sleep(retry_delay)
+
+    # Fetch and parse one REST page.  Returns its data and the absolute URL of the next page, resolved
+    # against the page's own URL so relative and absolute links both stay on the tenant.
+    async def fetch_page(self, url: str) -> tuple[list, str | None]:
+        page = await self.get_json(url, restHeaders)
+        next_link = (page.get('links') or {}).get('next')
+        return (page.get('data', []), urljoin(url, next_link) if next_link else None)
+
+    # Yield the data of each page of a REST listing.  Pagination is cursor based, so pages come in order,
+    # but page N+1 is requested as a task as soon as page N has been parsed, like iter_rest_pages does for
+    # the sync client, so its round trip overlaps with the caller processing page N.
+    async def iter_pages(self, url: str) -> AsyncIterator[list]:
+        next_page = asyncio.ensure_future(self.fetch_page(url))
+        try:
+            while next_page is not None:
+                data, next_url = await next_page
+                next_page = asyncio.ensure_future(self.fetch_page(next_url)) if next_url else None
+                yield data
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    # Independent listings run concurrently
+    async def paginate(self, url: str) -> List[dict]:
+        data = []
+        async for page_data in self.iter_pages(url):
+            data.extend(page_data)
+        return data
+
+    async def get_snyk_orgs(self, group_id: str) -> List[dict]:
+        found, orgs = api_cache.get(SNYK_ORGS_CACHE, cache_key(self.snyk_api_tenant, group_id))
+        if found:
+            return orgs
+
+        print("Collecting organization IDs")
+        orgs = await self.paginate(f'{self.base_url}/rest/groups/{group_id}/orgs?version={rest_version}&limit=100')
+        api_cache.set(SNYK_ORGS_CACHE, cache_key(self.snyk_api_tenant, group_id), orgs)
+        return orgs
+
+    async def get_org_integrations(self, org_id: str) -> dict:
+        return await self.get_json(f'{self.base_url}/v1/org/{org_id}/integrations', v1Headers)
+
+    async def get_org_integrations_bulk(self, org_ids: List[str], concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, dict]:
+        integrations = {}
+        missing_org_ids = []
+        for org_id in dict.fromkeys(org_ids):
+            found, cached_integrations = api_cache.get(ORG_INTEGRATIONS_CACHE, cache_key(self.snyk_api_tenant, org_id))
+            if found:
+                integrations[org_id] = cached_integrations
+            else:
+                missing_org_ids.append(org_id)
+
+        # Caps the lookups in flight, the session's pool caps the connections they share
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_integrations(org_id):
+            async with semaphore:
+                return await self.get_org_integrations(org_id)
+
+        results = await asyncio.gather(*(get_integrations(org_id) for org_id in missing_org_ids), return_exceptions=True)
+
+        for org_id, result in zip(missing_org_ids, results):
+            if isinstance(result, Exception):
+                print(f"Snyk Integrations endpoint failed for org {org_id}.")
+                print(result)
+                integrations[org_id] = None
+            else:
+                cache_org_integrations(org_id, self.snyk_api_tenant, result)
+                integrations[org_id] = result
+        return integrations
+
+_loop = None
+_loop_lock = threading.Lock()
+_clients: Dict[str, AsyncSnykClient] = {}
+
+# The event loop the async clients live on, started in a daemon thread on first use
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='snyk-async-api', daemon=True).start()
+            atexit.register(close_async_clients)
+        return _loop
+
+# Run a coroutine with the tenant's long-lived client on the background loop and wait for its result.
+# Safe to call from any thread.  The shared sync client, and with it the Snyk token, is resolved here on
+# the calling thread, so a missing token raises to the caller instead of failing on the loop thread.
+def run_with_client(snyk_api_tenant: str, call):
+    snyk_client = get_snyk_client()
+
+    async def run():
+        client = _clients.get(snyk_api_tenant)
+        if client is None:
+            client = _clients[snyk_api_tenant] = AsyncSnykClient(snyk_api_tenant)
+        await client.open(snyk_client)
+        return await call(client)
+
+    return asyncio.run_coroutine_threadsafe(run(), get_event_loop()).result()
+
+def close_async_clients() -> None:
+    async def close():
+        for client in _clients.values():
+            await client.close()
+
+    if _loop is not None and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(close(), _loop).result()
+        _loop.call_soon_threadsafe(_loop.stop)
+
+# Sync entry point: collect all orgs in a group
+def fetch_snyk_orgs(group_id: str, snyk_api_tenant: str = 'api.us.snyk.io') -> List[dict]:
+    return run_with_client(snyk_api_tenant, lambda client: client.get_snyk_orgs(group_id))
+
+# Sync entry point: collect integrations for many orgs concurrently, keyed by org ID
+def fetch_org_integrations(org_ids: List[str], snyk_api_tenant: str = 'api.us.snyk.io', concurrency: int = DEFAULT_CONCURRENCY) -> Dict[str, dict]:
+    return run_with_client(snyk_api_tenant, lambda client: client.get_org_integrations_bulk(org_ids, concurrency))
@@ -0,0 +1,91 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from apis.rateLimiter import RateLimiter, snyk_rate_limiter
+from helpers.metrics import endpoint_label, run_metrics
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+# Methods that are safe to send again after a timeout or a 5xx.  Others, like the POST that creates an
+# org, may already have taken effect, so they are only retried when the server never got them.
+RETRYABLE_METHODS = {'GET', 'HEAD'}
+
+# True when a request failed before it was sent, so sending it again cannot repeat it
+def failed_before_sending(error: requests.RequestException) -> bool:
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class SnykClient:
+    """
+    Owns a pooled requests.Session for all calls to the Snyk API so connections to the tenant are
+    kept alive and reused instead of paying a TCP and TLS handshake on every request.  Every request
+    is scheduled through the shared rate limiter and retried on 429.  GET requests are also retried on
+    5xx responses and connection errors, other methods only when the connection was never made.
+    """
+
+    def __init__(self, snyk_token: str, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT, keep_alive: bool = True, rate_limiter: RateLimiter = snyk_rate_limiter):
+        self.snyk_token = snyk_token
+        self.rate_limiter = rate_limiter
+        self.session = None
+        self.configure(pool_size, timeout, keep_alive)
+
+    # (Re)build the session with a new pool size, timeout and keep-alive setting
+    def configure(self, pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT, keep_alive: bool = True) -> None:
+        if self.session is not None:
+            self.session.close()
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Authorization'] = f'token {self.snyk_token}'
+        session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        self.session = session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        max_retries = self.rate_limiter.max_retries
+        endpoint = endpoint_label(url)
+        retryable_method = method.upper() in RETRYABLE_METHODS
+
+        for attempt in range(max_retries + 1):
+            try:
+                with self.rate_limiter.slot():
+                    started = time.monotonic()
+                    response = self.session.request(method.upper(), url, **kwargs)
+                run_metrics.observe_http(method, endpoint, response.status_code, time.monotonic() - started)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                run_metrics.observe_http(method, endpoint, 'error', time.monotonic() - started)
+                if attempt == max_retries or not (retryable_method or failed_before_sending(e)):
+                    raise
+                delay = self.rate_limiter.backoff_delay(attempt)
+                print(f"Attempt {attempt + 1} failed: {e}.  Retrying in {delay:.1f} seconds.")
+                time.sleep(delay)
+                continue
+
+            # A 429 pauses the shared limiter, so the retry below waits for the limit to reset
+            self.rate_limiter.update_from_response(response.status_code, response.headers, attempt)
+            retryable_status = response.status_code == 429 or (retryable_method and self.rate_limiter.should_retry(response.status_code))
+            if retryable_status and attempt < max_retries:
+                if response.status_code != 429:
+                    time.sleep(self.rate_limiter.backoff_delay(attempt))
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
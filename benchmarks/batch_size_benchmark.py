@@ -0,0 +1,68 @@
+"""
+Show the batch size tradeoff: for each org size and batch size, the number of batches and new <org>-N
+orgs, the time a single batch import takes and the estimated total import time.  Split times are
+measured by really splitting a synthetic import file; import times are projected from throughput.
+
+Run from the repo root:
+    python benchmarks/batch_size_benchmark.py --target-counts 800 --target-counts 50000 --targets-per-second 3
+"""
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import typer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.batching import choose_batch_size
+from utils.importTargets import stream_split_import_targets
+
+app = typer.Typer()
+
+def write_synthetic_import_file(file_path: str, target_count: int) -> None:
+    with open(file_path, 'w') as file:
+        file.write('{"targets": [')
+        for i in range(target_count):
+            if i:
+                file.write(',')
+            json.dump({'orgId': 'benchmark-org', 'integrationId': 'benchmark-integration', 'target': {'name': f'repo-{i}', 'owner': 'benchmark', 'branch': 'main'}}, file)
+        file.write(']}')
+
+def measure_split_seconds(file_path: str, batch_size: int, directory: str) -> float:
+    started = time.perf_counter()
+    batch_files, _ = stream_split_import_targets(file_path, batch_size, lambda batch_number: os.path.join(directory, f'batch-{batch_size}-{batch_number}.json'))
+    elapsed = time.perf_counter() - started
+    for batch_file in batch_files:
+        os.remove(batch_file)
+    return elapsed
+
+@app.command()
+def run(
+    target_counts: List[int] = typer.Option([800, 5000, 50000], "--target-counts", help="Org sizes (targets per org) to benchmark"),
+    batch_sizes: List[int] = typer.Option([500, 1000, 2500, 5000], "--batch-sizes", help="Fixed batch sizes to compare against auto"),
+    targets_per_second: float = typer.Option(2.0, "--targets-per-second", help="Measured snyk-api-import throughput used to project import time"),
+    org_setup_seconds: float = typer.Option(20.0, "--org-setup-seconds", help="Time to create an <org>-N org and wait for its integrations"),
+):
+    with tempfile.TemporaryDirectory() as directory:
+        for target_count in target_counts:
+            import_file = os.path.join(directory, f'targets-{target_count}.json')
+            write_synthetic_import_file(import_file, target_count)
+
+            auto_batch_size = choose_batch_size(target_count, targets_per_second)
+            print(f'\n{target_count} targets (auto picks {auto_batch_size})')
+            print(f'{"batch size":>12} {"batches":>8} {"new orgs":>9} {"split s":>8} {"batch min":>10} {"total min":>10}')
+            for batch_size in sorted(set(batch_sizes + [auto_batch_size])):
+                batches = max(1, math.ceil(target_count / batch_size))
+                new_orgs = batches - 1
+                split_seconds = measure_split_seconds(import_file, batch_size, directory)
+                batch_minutes = min(batch_size, target_count) / targets_per_second / 60
+                total_minutes = (target_count / targets_per_second + new_orgs * org_setup_seconds + split_seconds) / 60
+                label = f'{batch_size}{"*" if batch_size == auto_batch_size else ""}'
+                print(f'{label:>12} {batches:>8} {new_orgs:>9} {split_seconds:>8.2f} {batch_minutes:>10.1f} {total_minutes:>10.1f}')
+
+if __name__ == "__main__":
+    app()
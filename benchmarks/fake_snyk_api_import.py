@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the snyk-api-import binary.  It takes the same arguments as the two subcommands the
+importer runs and writes the same files into SNYK_LOG_PATH, without calling any API:
+
+    import:data --orgsData=FILE   writes github-enterprise-import-targets.json with synthetic targets
+    import --file=FILE            logs every target of FILE to <orgId>.imported-targets.log, or to
+                                  <orgId>.failed-imports.log for injected failures
+
+Tuned with environment variables:
+    FAKE_SNYK_IMPORT_TARGETS_PER_ORG     targets generated per org by import:data (default 100)
+    FAKE_SNYK_IMPORT_SECONDS_PER_TARGET  time import spends on each target (default 0)
+    FAKE_SNYK_IMPORT_FAIL_EVERY          every Nth target fails to import (default 0, none)
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+IMPORT_TARGETS_FILE_NAME = 'github-enterprise-import-targets.json'
+
+def argument(arguments: list, name: str) -> str | None:
+    for value in arguments:
+        if value.startswith(f'--{name}='):
+            return value.split('=', 1)[1]
+    return None
+
+def import_data(arguments: list, log_path: str) -> int:
+    targets_per_org = int(os.environ.get('FAKE_SNYK_IMPORT_TARGETS_PER_ORG', '100'))
+    with open(argument(arguments, 'orgsData')) as file:
+        orgs_data = json.load(file)['orgData']
+
+    with open(os.path.join(log_path, IMPORT_TARGETS_FILE_NAME), 'w') as file:
+        file.write('{"targets": [')
+        written = 0
+        for org_data in orgs_data:
+            integration_id = (org_data.get('integrations') or {}).get('github-enterprise')
+            for index in range(targets_per_org):
+                if written:
+                    file.write(',')
+                json.dump({'target': {'name': f'repo-{index}', 'owner': org_data['name'], 'branch': 'main'}, 'integrationId': integration_id, 'orgId': org_data['orgId']}, file)
+                written += 1
+        file.write(']}')
+    print(f'Generated {written} targets in {IMPORT_TARGETS_FILE_NAME}')
+    return 0
+
+def import_targets(arguments: list, log_path: str) -> int:
+    seconds_per_target = float(os.environ.get('FAKE_SNYK_IMPORT_SECONDS_PER_TARGET', '0'))
+    fail_every = int(os.environ.get('FAKE_SNYK_IMPORT_FAIL_EVERY', '0'))
+    with open(argument(arguments, 'file')) as file:
+        targets = json.load(file)['targets']
+
+    logs = {}
+    try:
+        for index, import_target in enumerate(targets, start=1):
+            if seconds_per_target:
+                time.sleep(seconds_per_target)
+            failed = fail_every and index % fail_every == 0
+            suffix = 'failed-imports.log' if failed else 'imported-targets.log'
+            log_file = os.path.join(log_path, f"{import_target['orgId']}.{suffix}")
+            if log_file not in logs:
+                logs[log_file] = open(log_file, 'a')
+            record = {'target': import_target['target'], 'orgId': import_target['orgId'], 'integrationId': import_target['integrationId'], 'time': datetime.now(timezone.utc).isoformat()}
+            if failed:
+                record['errorMessage'] = 'Injected failure'
+            logs[log_file].write(json.dumps(record) + '\n')
+    finally:
+        for log in logs.values():
+            log.close()
+    print(f'Imported {len(targets)} targets from {argument(arguments, "file")}')
+    return 0
+
+def main(arguments: list) -> int:
+    log_path = os.environ.get('SNYK_LOG_PATH', os.getcwd())
+    if not arguments:
+        print('Usage: fake_snyk_api_import.py import:data|import ...', file=sys.stderr)
+        return 2
+    if arguments[0] == 'import:data':
+        return import_data(arguments[1:], log_path)
+    if arguments[0] == 'import':
+        return import_targets(arguments[1:], log_path)
+    print(f'Unknown command {arguments[0]}', file=sys.stderr)
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,142 @@
+"""
+End-to-end throughput of index.py without touching Snyk or GitHub.  Each scenario starts the local API
+stand-in from mock_api.py, puts the fake snyk-api-import binary in a scratch directory, runs a full
+import of ORGS orgs with TARGETS targets each and reports the wall time together with the per-phase
+timings from the run's metrics report.
+
+Run from the repo root:
+    python benchmarks/import_benchmark.py --scenario 10x100 --scenario 500x100 --latency 0.05 --throttle-every 100
+"""
+import csv
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import typer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_api import MockApi, MockApiServer, github_org_name, mock_id, snyk_org_name
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_COMMAND = [sys.executable, os.path.join(REPO_DIRECTORY, 'index.py'), 'run-snyk-api-import']
+FAKE_SNYK_API_IMPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_snyk_api_import.py')
+DEFAULT_SCENARIOS = ['10x100', '500x100', '5000x100', '1x100000']
+REPORTED_PHASES = ['snyk_orgs', 'github_orgs', 'org_integrations', 'import_data', 'split', 'org_creation', 'batch_import']
+FAKE_SNYK_TOKEN = '00000000-0000-4000-8000-000000000000'
+FAKE_GITHUB_TOKEN = 'ghp_' + '0' * 36
+
+app = typer.Typer()
+
+def parse_scenario(scenario: str) -> tuple[int, int]:
+    orgs, _, targets = scenario.lower().partition('x')
+    return (int(orgs), int(targets))
+
+# Copy the fake binary into the scratch directory, where index.py looks for snyk-api-import
+def install_fake_snyk_api_import(directory: str) -> str:
+    binary_path = os.path.join(directory, 'snyk-api-import')
+    with open(FAKE_SNYK_API_IMPORT) as source, open(binary_path, 'w') as binary:
+        source.readline()
+        binary.write(f'#!{sys.executable}\n')
+        binary.write(source.read())
+    os.chmod(binary_path, os.stat(binary_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return os.path.basename(binary_path)
+
+def write_mapping_csv(file_path: str, org_count: int) -> None:
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['GitHub-Org-Name', 'Snyk-Org-Name'])
+        for index in range(org_count):
+            writer.writerow([github_org_name(index), snyk_org_name(index)])
+
+def read_json(file_path: str) -> dict:
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def run_scenario(directory: str, org_count: int, targets_per_org: int, api: MockApi, base_url: str, import_arguments: List[str], seconds_per_target: float) -> dict:
+    binary_name = install_fake_snyk_api_import(directory)
+    csv_file_path = os.path.join(directory, 'mapping.csv')
+    write_mapping_csv(csv_file_path, org_count)
+
+    env = {
+        **os.environ,
+        'SNYK_API_BASE_URL': base_url,
+        'GITHUB_API_URL': base_url,
+        'SNYK_TOKEN': FAKE_SNYK_TOKEN,
+        'FAKE_SNYK_IMPORT_TARGETS_PER_ORG': str(targets_per_org),
+        'FAKE_SNYK_IMPORT_SECONDS_PER_TARGET': str(seconds_per_target),
+    }
+    args = [
+        *INDEX_COMMAND,
+        f'--csv-file-path={csv_file_path}',
+        f'--github-token={FAKE_GITHUB_TOKEN}',
+        f'--group-id={mock_id("group")}',
+        f'--snyk-api-import-name={binary_name}',
+        f'--snyk-source-org-id={mock_id("org", snyk_org_name(0))}',
+        *import_arguments,
+    ]
+
+    started = time.perf_counter()
+    with open(os.path.join(directory, 'run.log'), 'w') as log:
+        returncode = subprocess.run(args, cwd=directory, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    wall_seconds = time.perf_counter() - started
+
+    return {
+        'returncode': returncode,
+        'wall_seconds': wall_seconds,
+        'metrics': read_json(os.path.join(directory, 'snyk-import-metrics.json')),
+        'results': read_json(os.path.join(directory, 'snyk-import-results.json')),
+        'api': api.stats(),
+    }
+
+@app.command()
+def run(
+    scenarios: List[str] = typer.Option(DEFAULT_SCENARIOS, "--scenario", help="ORGSxTARGETS: number of orgs and targets per org, for example 500x100"),
+    latency: float = typer.Option(0.0, "--latency", help="Seconds the API stand-in adds to every response"),
+    page_size: int = typer.Option(100, "--page-size", help="Maximum items per REST page, lower it to test deep pagination"),
+    throttle_every: int = typer.Option(0, "--throttle-every", help="Answer every Nth API request with a 429 (0 turns it off)"),
+    existing_targets: int = typer.Option(0, "--existing-targets", help="Targets each org already has in Snyk, for --incremental runs"),
+    seconds_per_target: float = typer.Option(0.0, "--seconds-per-target", help="Time the fake snyk-api-import spends importing each target"),
+    max_parallel_orgs: int = typer.Option(4, "--max-parallel-orgs", help="Passed to index.py"),
+    batch_size: str = typer.Option("1000", "--batch-size", help="Passed to index.py"),
+    snyk_requests_per_second: float = typer.Option(1000.0, "--snyk-requests-per-second", help="Passed to index.py.  Kept high so the stand-in's latency and 429s are what is measured"),
+    extra_arguments: List[str] = typer.Option([], "--index-argument", help="Extra argument passed to index.py, for example --index-argument=--incremental"),
+    keep_directory: bool = typer.Option(False, "--keep-directory", help="Keep each scenario's scratch directory with its logs and reports", is_flag=True),
+):
+    import_arguments = [
+        f'--max-parallel-orgs={max_parallel_orgs}',
+        f'--batch-size={batch_size}',
+        f'--snyk-requests-per-second={snyk_requests_per_second}',
+        *extra_arguments,
+    ]
+    header = f'{"scenario":>10} {"exit":>4} {"wall s":>8} ' + ' '.join(f'{phase:>16}' for phase in REPORTED_PHASES) + f' {"requests":>9} {"429s":>6} {"imported":>9}'
+    print('Phase times are in seconds and summed across orgs, so with parallel orgs they can exceed the wall time.')
+    print(header)
+
+    for scenario in scenarios:
+        org_count, targets_per_org = parse_scenario(scenario)
+        directory = tempfile.mkdtemp(prefix=f'snyk-import-benchmark-{scenario}-')
+        api = MockApi(org_count, existing_targets, page_size, latency, throttle_every)
+        with MockApiServer(api) as server:
+            result = run_scenario(directory, org_count, targets_per_org, api, server.base_url, import_arguments, seconds_per_target)
+
+        phases = result['metrics'].get('phases', {})
+        imported = result['results'].get('totals', {}).get('imported', 0)
+        print(f'{scenario:>10} {result["returncode"]:>4} {result["wall_seconds"]:>8.1f} ' + ' '.join(f'{phases.get(phase, {}).get("seconds", 0):>16.1f}' for phase in REPORTED_PHASES) + f' {result["api"]["requests"]:>9} {result["api"]["throttled"]:>6} {imported:>9}')
+
+        if keep_directory:
+            print(f'  kept {directory}')
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,236 @@
+"""
+Local stand-in for the Snyk REST/v1 endpoints used in apis/snykApi.py and apis/snykAsyncApi.py and the
+GitHub org endpoints used in apis/githubapi.py.  Latency, page size and injected 429s are configurable
+so runs against it show how the importer behaves with slow, deeply paginated or throttled APIs.
+
+The group has orgs snyk-org-0..N-1, each mapped to GitHub org gh-org-0..N-1 that the token is an active
+member of.  Point the importer at it with SNYK_API_BASE_URL and GITHUB_API_URL.
+
+Run from the repo root:
+    python benchmarks/mock_api.py --orgs 500 --port 8080 --latency 0.05 --throttle-every 50
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+ID_NAMESPACE = uuid.UUID('6f1d3a52-3c8e-4a55-9d43-2f1a6d1c1b10')
+GROUP_ORGS_PATH = re.compile(r'^/rest/groups/(?P<group_id>[^/]+)/orgs$')
+ORG_PATH = re.compile(r'^/rest/orgs/(?P<org_id>[^/]+)$')
+ORG_TARGETS_PATH = re.compile(r'^/rest/orgs/(?P<org_id>[^/]+)/targets$')
+ORG_INTEGRATIONS_PATH = re.compile(r'^/v1/org/(?P<org_id>[^/]+)/integrations$')
+GITHUB_MEMBERSHIP_PATH = re.compile(r'^/user/memberships/orgs/(?P<org>[^/]+)$')
+
+def mock_id(*parts) -> str:
+    return str(uuid.uuid5(ID_NAMESPACE, '/'.join(str(part) for part in parts)))
+
+def snyk_org_name(index: int) -> str:
+    return f'snyk-org-{index}'
+
+def github_org_name(index: int) -> str:
+    return f'gh-org-{index}'
+
+class MockApi:
+    """State of the stand-in: the group's orgs, created orgs and request counters."""
+
+    def __init__(self, org_count: int, existing_targets_per_org: int = 0, page_size: int = 100, latency: float = 0, throttle_every: int = 0, retry_after: float = 1):
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.existing_targets_per_org = existing_targets_per_org
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.throttled = 0
+        self.request_count = 0
+        self.orgs = []
+        self.orgs_by_id = {}
+        self.github_orgs = {}
+        for index in range(org_count):
+            self.add_org(snyk_org_name(index), github_org_name(index))
+            self.github_orgs[github_org_name(index)] = index
+
+    def add_org(self, name: str, github_org: str | None = None) -> dict:
+        org = {'id': mock_id('org', name), 'type': 'org', 'attributes': {'name': name, 'slug': name, 'group_id': mock_id('group')}}
+        with self.lock:
+            self.orgs.append(org)
+            self.orgs_by_id[org['id']] = (org, github_org)
+        return org
+
+    # Count the request and decide whether it gets a 429
+    def admit(self, route: str) -> bool:
+        with self.lock:
+            self.request_count += 1
+            self.requests[route] += 1
+            if self.throttle_every and self.request_count % self.throttle_every == 0:
+                self.throttled += 1
+                return False
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'requests': self.request_count, 'throttled': self.throttled, 'by_route': dict(self.requests), 'created_orgs': len(self.orgs) - len(self.github_orgs)}
+
+    def page(self, items: list, path: str, query: dict) -> dict:
+        limit = min(int(query.get('limit', [self.page_size])[0]), self.page_size)
+        start = int(query.get('starting_after', [0])[0])
+        page = {'data': items[start:start + limit], 'links': {}}
+        if start + limit < len(items):
+            next_query = {key: values[0] for key, values in query.items()}
+            next_query['starting_after'] = start + limit
+            page['links']['next'] = f'{path}?{urlencode(next_query)}'
+        return page
+
+    def existing_targets(self, org_id: str) -> list:
+        _, github_org = self.orgs_by_id.get(org_id, (None, None))
+        if not github_org:
+            return []
+        return [
+            {'id': mock_id('target', org_id, index), 'type': 'target', 'attributes': {'display_name': f'{github_org}/repo-{index}', 'url': f'https://github.com/{github_org}/repo-{index}'}}
+            for index in range(self.existing_targets_per_org)
+        ]
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    api: MockApi = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, body=None, headers: dict | None = None) -> None:
+        content = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        # GitHub clients read their remaining rate limit from every response
+        self.send_header('X-RateLimit-Limit', '5000')
+        self.send_header('X-RateLimit-Remaining', '4999')
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def handle_request(self, method: str) -> None:
+        api = self.api
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = None
+        if method == 'POST':
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        route = self.route(method, url.path)
+        if api.latency:
+            time.sleep(api.latency)
+        if not api.admit(route):
+            self.send_json(429, {'message': 'Too many requests'}, {'Retry-After': str(api.retry_after)})
+            return
+
+        if route == 'GET /rest/groups/{id}/orgs':
+            self.send_json(200, api.page(list(api.orgs), url.path, query))
+        elif route == 'GET /rest/orgs/{id}':
+            org = api.orgs_by_id.get(ORG_PATH.match(url.path)['org_id'])
+            if org:
+                self.send_json(200, {'data': org[0]})
+            else:
+                self.send_json(404, {'errors': [{'detail': 'Org not found'}]})
+        elif route == 'GET /rest/orgs/{id}/targets':
+            self.send_json(200, api.page(api.existing_targets(ORG_TARGETS_PATH.match(url.path)['org_id']), url.path, query))
+        elif route == 'GET /v1/org/{id}/integrations':
+            org_id = ORG_INTEGRATIONS_PATH.match(url.path)['org_id']
+            self.send_json(200, {'github-enterprise': mock_id('integration', org_id)})
+        elif route == 'POST /v1/org':
+            org = api.add_org(body['name'])
+            self.send_json(201, {'id': org['id'], 'name': body['name'], 'slug': body['name'], 'url': f'https://app.snyk.io/org/{body["name"]}', 'created': time.strftime('%Y-%m-%dT%H:%M:%SZ')})
+        elif route == 'GET /user/orgs':
+            self.send_github_orgs(query)
+        elif route == 'GET /user/memberships/orgs/{org}':
+            self.send_github_membership(GITHUB_MEMBERSHIP_PATH.match(url.path)['org'])
+        elif route == 'GET /rate_limit':
+            self.send_json(200, {'resources': {'core': {'limit': 5000, 'remaining': 4999, 'reset': int(time.time()) + 3600, 'used': 1}}, 'rate': {'limit': 5000, 'remaining': 4999, 'reset': int(time.time()) + 3600, 'used': 1}})
+        else:
+            self.send_json(404, {'message': f'No mock for {method} {url.path}'})
+
+    def route(self, method: str, path: str) -> str:
+        for pattern, route in ((GROUP_ORGS_PATH, '/rest/groups/{id}/orgs'), (ORG_TARGETS_PATH, '/rest/orgs/{id}/targets'), (ORG_PATH, '/rest/orgs/{id}'), (ORG_INTEGRATIONS_PATH, '/v1/org/{id}/integrations'), (GITHUB_MEMBERSHIP_PATH, '/user/memberships/orgs/{org}')):
+            if pattern.match(path):
+                return f'{method} {route}'
+        return f'{method} {path}'
+
+    def github_org(self, name: str) -> dict:
+        index = self.api.github_orgs[name]
+        return {'id': index + 1, 'login': name, 'name': name, 'url': f'{self.base_url()}/orgs/{name}', 'html_url': f'https://github.com/{name}'}
+
+    def base_url(self) -> str:
+        return f'http://{self.headers.get("Host")}'
+
+    # Pages are numbered from 1 like GitHub's, and an empty page ends the listing
+    def send_github_orgs(self, query: dict) -> None:
+        per_page = int(query.get('per_page', [30])[0])
+        page = int(query.get('page', [1])[0])
+        names = list(self.api.github_orgs)[(page - 1) * per_page:page * per_page]
+        self.send_json(200, [self.github_org(name) for name in names])
+
+    def send_github_membership(self, name: str) -> None:
+        if name not in self.api.github_orgs:
+            self.send_json(404, {'message': 'Not Found'})
+            return
+        etag = f'"{mock_id("membership", name)}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_json(304, headers={'ETag': etag})
+            return
+        self.send_json(200, {'state': 'active', 'role': 'member', 'organization': self.github_org(name)}, {'ETag': etag})
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+class MockApiServer:
+    """Serves a MockApi on a local port from a background thread."""
+
+    def __init__(self, api: MockApi, host: str = '127.0.0.1', port: int = 0):
+        handler = type('BoundMockApiHandler', (MockApiHandler,), {'api': api})
+        self.api = api
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == '__main__':
+    import typer
+
+    def serve(
+        orgs: int = typer.Option(10, "--orgs", help="Number of Snyk orgs in the group and matching GitHub orgs"),
+        existing_targets: int = typer.Option(0, "--existing-targets", help="Targets each org already has in Snyk"),
+        page_size: int = typer.Option(100, "--page-size", help="Maximum items per REST page"),
+        latency: float = typer.Option(0.0, "--latency", help="Seconds added to every response"),
+        throttle_every: int = typer.Option(0, "--throttle-every", help="Answer every Nth request with a 429 (0 turns it off)"),
+        retry_after: float = typer.Option(1.0, "--retry-after", help="Retry-After seconds sent with injected 429s"),
+        port: int = typer.Option(8080, "--port", help="Port to listen on"),
+    ):
+        with MockApiServer(MockApi(orgs, existing_targets, page_size, latency, throttle_every, retry_after), port=port) as server:
+            print(f'Serving the Snyk and GitHub API stand-in on {server.base_url}.  Group ID: {mock_id("group")}')
+            try:
+                server.thread.join()
+            except KeyboardInterrupt:
+                pass
+
+    typer.run(serve)
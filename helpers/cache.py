@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 3600
+
+class ApiCache:
+    """
+    Cache for API lookups keyed by namespace and key (for example tenant and group or org ID).  Entries
+    live in memory and, when a path is configured, in a SQLite file so repeated runs reuse them.
+    Every entry expires after its TTL and can be invalidated explicitly.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, path: str | None = None, enabled: bool = True):
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+        self.configure(ttl, path, enabled)
+
+    def configure(self, ttl: float = DEFAULT_TTL, path: str | None = None, enabled: bool = True) -> None:
+        with self._lock:
+            self.ttl = ttl
+            self.enabled = enabled
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            if enabled and path:
+                self._connection = sqlite3.connect(path, check_same_thread=False)
+                self._connection.execute('CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, expires_at REAL, PRIMARY KEY (namespace, key))')
+                self._connection.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),))
+                self._connection.commit()
+
+    # Returns (found, value) so cached falsy values are told apart from misses
+    def get(self, namespace: str, key: str) -> tuple[bool, object]:
+        if not self.enabled:
+            return (False, None)
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is None and self._connection is not None:
+                row = self._connection.execute('SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[1])
+                    self._memory[(namespace, key)] = entry
+
+            if entry is not None and entry[1] >= now:
+                self.hits += 1
+                return (True, entry[0])
+
+            self._memory.pop((namespace, key), None)
+            self.misses += 1
+            return (False, None)
+
+    def set(self, namespace: str, key: str, value, ttl: float | None = None) -> None:
+        if not self.enabled:
+            return
+
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._memory[(namespace, key)] = (value, expires_at)
+            if self._connection is not None:
+                self._connection.execute('INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)', (namespace, key, json.dumps(value), expires_at))
+                self._connection.commit()
+
+    # Drop one key, or a whole namespace when no key is given
+    def invalidate(self, namespace: str, key: str | None = None) -> None:
+        with self._lock:
+            if key is None:
+                self._memory = {k: v for k, v in self._memory.items() if k[0] != namespace}
+                if self._connection is not None:
+                    self._connection.execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+            else:
+                self._memory.pop((namespace, key), None)
+                if self._connection is not None:
+                    self._connection.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+            if self._connection is not None:
+                self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory = {}
+            if self._connection is not None:
+                self._connection.execute('DELETE FROM cache')
+                self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._memory)}
+
+    def describe(self) -> str:
+        stats = self.stats()
+        return f"Cache: {stats['hits']} hits, {stats['misses']} misses"
+
+def cache_key(*parts) -> str:
+    return ':'.join(str(part) for part in parts)
+
+# Shared cache for Snyk and GitHub lookups
+api_cache = ApiCache()
@@ -1,14 +1,16 @@
+import hashlib
 import os
 import re
 import sys
 
+# Raises instead of exiting, because the token is read on first use, which can be on the background
+# event loop thread of the async client or in a worker thread where sys.exit() would not stop the run
 def get_snyk_token():
     SNYK_TOKEN = check_if_snyk_token_exist()
     
     pattern = re.compile(r'([\d\w]{8}-[\d\w]{4}-[\d\w]{4}-[\d\w]{4}-[\d\w]{12})')
-    if pattern.fullmatch(SNYK_TOKEN) == None:
-        print("Snyk token is not defined or not valid.")
-        sys.exit()
+    if SNYK_TOKEN == None or pattern.fullmatch(SNYK_TOKEN) == None:
+        raise ValueError("Snyk token is not defined or not valid.")
     else:
         return SNYK_TOKEN
 
@@ -16,7 +18,7 @@ def get_github_token():
     GITHUB_TOKEN = check_if_github_token_exist()
 
     pattern = re.compile(r'ghp_[\d\w]{36}')
-    if pattern.fullmatch(GITHUB_TOKEN) == None:
+    if GITHUB_TOKEN == None or pattern.fullmatch(GITHUB_TOKEN) == None:
         print("GitHub token is not defined or not valid.")
         sys.exit()
     else:
@@ -40,4 +42,12 @@ def check_if_snyk_token_exist():
             return os.getenv('SNYK_TOKEN')
     except:
         print("Snyk token does not exist")
-        sys.exit()
\ No newline at end of file
+        sys.exit()
+
+# sha256 of a file, read in chunks so large files are not loaded at once
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
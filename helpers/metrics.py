@@ -0,0 +1,192 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+from urllib.parse import urlparse
+
+# Upper bounds in seconds of the HTTP latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROMETHEUS_PREFIX = 'snyk_import'
+ID_PATH_SEGMENT = re.compile(r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+# Endpoint label of a URL: its path with org, group and other IDs replaced, so every org shares one series
+def endpoint_label(url: str) -> str:
+    path = urlparse(url).path or '/'
+    return '/'.join('{id}' if ID_PATH_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+class Timing:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'seconds': round(self.seconds, 3), 'max_seconds': round(self.max_seconds, 3)}
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': {str(upper_bound): count for upper_bound, count in zip(self.buckets, self.bucket_counts)}}
+
+class RunMetrics:
+    """
+    Timings of one run: wall time per phase for the whole run and per org, HTTP request counts and
+    latency histograms per endpoint, and snyk-api-import wall time per subcommand.  Safe to share between
+    import workers and threads; the report is written as JSON and, optionally, as a Prometheus textfile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = datetime.now(timezone.utc)
+            self._started = time.monotonic()
+            self.phases = {}
+            self.org_phases = {}
+            self.http_requests = {}
+            self.http_latency = {}
+            self.processes = {}
+
+    def record_phase(self, phase: str, seconds: float, org: str | None = None) -> None:
+        with self._lock:
+            self.phases.setdefault(phase, Timing()).add(seconds)
+            if org is not None:
+                self.org_phases.setdefault(org, {}).setdefault(phase, Timing()).add(seconds)
+
+    @contextmanager
+    def timer(self, phase: str, org: str | None = None):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.monotonic() - started, org)
+
+    # Time spent producing the items of a lazy iterable, for phases that are interleaved with the import
+    def timed_iter(self, phase: str, items: Iterable) -> Iterator:
+        iterator = iter(items)
+        seconds = 0.0
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.monotonic() - started
+                yield item
+        finally:
+            self.record_phase(phase, seconds)
+
+    # status is the HTTP status code, or 'error' when no response came back
+    def observe_http(self, method: str, endpoint: str, status, seconds: float) -> None:
+        with self._lock:
+            key = (method.upper(), endpoint, str(status))
+            self.http_requests[key] = self.http_requests.get(key, 0) + 1
+            self.http_latency.setdefault((method.upper(), endpoint), Histogram()).observe(seconds)
+
+    def observe_process(self, command: str, seconds: float, returncode: int, timed_out: bool = False) -> None:
+        with self._lock:
+            process = self.processes.setdefault(command, {'timing': Timing(), 'failed': 0, 'timed_out': 0})
+            process['timing'].add(seconds)
+            if returncode != 0 or timed_out:
+                process['failed'] += 1
+            if timed_out:
+                process['timed_out'] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(),
+                'duration_seconds': round(time.monotonic() - self._started, 3),
+                'phases': {phase: timing.to_dict() for phase, timing in sorted(self.phases.items())},
+                'orgs': {org: {phase: timing.to_dict() for phase, timing in sorted(phases.items())} for org, phases in sorted(self.org_phases.items())},
+                'http': {
+                    'requests': [{'method': method, 'endpoint': endpoint, 'status': status, 'count': count} for (method, endpoint, status), count in sorted(self.http_requests.items())],
+                    'latency': [{'method': method, 'endpoint': endpoint, **histogram.to_dict()} for (method, endpoint), histogram in sorted(self.http_latency.items())]
+                },
+                'processes': {command: {**process['timing'].to_dict(), 'failed': process['failed'], 'timed_out': process['timed_out']} for command, process in sorted(self.processes.items())}
+            }
+
+    def prometheus_lines(self) -> list[str]:
+        report = self.report()
+        lines = [
+            f'# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge',
+            f'{PROMETHEUS_PREFIX}_run_duration_seconds {report["duration_seconds"]}',
+            f'# TYPE {PROMETHEUS_PREFIX}_phase_seconds gauge'
+        ]
+        lines.extend(f'{PROMETHEUS_PREFIX}_phase_seconds{labels(phase=phase)} {timing["seconds"]}' for phase, timing in report['phases'].items())
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_phase_runs gauge')
+        lines.extend(f'{PROMETHEUS_PREFIX}_phase_runs{labels(phase=phase)} {timing["count"]}' for phase, timing in report['phases'].items())
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_org_phase_seconds gauge')
+        for org, phases in report['orgs'].items():
+            lines.extend(f'{PROMETHEUS_PREFIX}_org_phase_seconds{labels(org=org, phase=phase)} {timing["seconds"]}' for phase, timing in phases.items())
+
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_http_requests_total counter')
+        lines.extend(f'{PROMETHEUS_PREFIX}_http_requests_total{labels(method=request["method"], endpoint=request["endpoint"], status=request["status"])} {request["count"]}' for request in report['http']['requests'])
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_http_request_duration_seconds histogram')
+        for latency in report['http']['latency']:
+            series = f'{PROMETHEUS_PREFIX}_http_request_duration_seconds'
+            for upper_bound, count in latency['buckets'].items():
+                lines.append(f'{series}_bucket{labels(method=latency["method"], endpoint=latency["endpoint"], le=upper_bound)} {count}')
+            lines.append(f'{series}_bucket{labels(method=latency["method"], endpoint=latency["endpoint"], le="+Inf")} {latency["count"]}')
+            lines.append(f'{series}_sum{labels(method=latency["method"], endpoint=latency["endpoint"])} {latency["sum"]}')
+            lines.append(f'{series}_count{labels(method=latency["method"], endpoint=latency["endpoint"])} {latency["count"]}')
+
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_process_seconds gauge')
+        lines.extend(f'{PROMETHEUS_PREFIX}_process_seconds{labels(command=command)} {process["seconds"]}' for command, process in report['processes'].items())
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_process_runs gauge')
+        lines.extend(f'{PROMETHEUS_PREFIX}_process_runs{labels(command=command)} {process["count"]}' for command, process in report['processes'].items())
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_process_failures gauge')
+        lines.extend(f'{PROMETHEUS_PREFIX}_process_failures{labels(command=command)} {process["failed"]}' for command, process in report['processes'].items())
+        return lines
+
+    def write_json(self, path: str) -> None:
+        write_atomically(path, json.dumps(self.report(), indent=4))
+
+    # Written to a temporary file and renamed, so the node exporter textfile collector never reads half a file
+    def write_prometheus(self, path: str) -> None:
+        write_atomically(path, '\n'.join(self.prometheus_lines()) + '\n')
+
+    def describe(self) -> str:
+        report = self.report()
+        slowest = sorted(report['phases'].items(), key=lambda item: item[1]['seconds'], reverse=True)[:3]
+        http_count = sum(request['count'] for request in report['http']['requests'])
+        phases = ', '.join(f'{phase} {timing["seconds"]:.0f}s' for phase, timing in slowest) or 'none'
+        return f"Run took {report['duration_seconds']:.0f} seconds.  Slowest phases: {phases}.  {http_count} HTTP requests."
+
+def labels(**values) -> str:
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(values, escaped)) + '}'
+
+def write_atomically(path: str, content: str) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as file:
+        file.write(content)
+    os.replace(temporary_path, path)
+
+# Shared metrics for the current run
+run_metrics = RunMetrics()
@@ -1,165 +1,994 @@
-from typing import Annotated
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Annotated, List
 import typer
-from apis.snykApi import get_org_integrations, get_snyk_orgs
-from utils.utils import clean_up, find_log_files, find_org_data_files, import_repos, read_csv_file, writeJsonFile, find_batch_import_data_files
-from apis.githubapi import list_organizations
+# Only modules without network clients are imported here.  The Snyk and GitHub API modules (requests,
+# aiohttp, PyGithub) are imported inside the commands that call them, so --help and the option checks
+# start fast and never need a token.
+from apis.rateLimiter import github_rate_limiter, snyk_rate_limiter
+from helpers.cache import api_cache, cache_key
+from helpers.helper import file_sha256
+from helpers.metrics import run_metrics
+from utils.archive import DEFAULT_ARCHIVE_DIRECTORY, DEFAULT_RETENTION_DAYS, RunArchive
+from utils.batching import parse_batch_size, throughput_tracker
+from utils.checkpoint import CheckpointJournal, IMPORTED, SPLIT
+from utils.csvMappings import check_csv_file, iter_chunks, iter_csv_mappings
+from utils.orgIndex import GroupOrgIndex
+from utils.processRunner import process_runner
+from utils.sharding import merge_failed_targets, merge_results, shard_of, shard_path, shard_paths
+from utils.importLogs import ingest_import_logs
+from utils.watch import CsvWatcher
+from utils.workspace import JobWorkspace, create_run_directory, existing_workspace
 
 app = typer.Typer()
 
+# Options shared by the run-snyk-api-import, watch and plan commands
+CsvFilePathOption = Annotated[str, typer.Option(
+    "--csv-file-path",
+    help="Path to the CSV file containing GitHub organization mappings",
+    exists=True,
+    file_okay=True,
+    dir_okay=False,
+    readable=True
+)]
+GithubTokenOption = Annotated[str, typer.Option(
+    "--github-token",
+    help="GitHub personal access token for authentication",
+    envvar="GITHUB_TOKEN"
+)]
+GroupIdOption = Annotated[str, typer.Option(
+    "--group-id",
+    help="Snyk group ID",
+    envvar="SNYK_GROUP_ID"
+)]
+SnykApiImportNameOption = Annotated[str, typer.Option(
+    "--snyk-api-import-name",
+    help="Name of the Snyk API import binary in root directory https://github.com/snyk/snyk-api-import/releases",
+    exists=True,
+    file_okay=True,
+    dir_okay=False,
+    readable=True
+)]
+SnykApiTenantOption = Annotated[str, typer.Option(
+    "--snyk-api-tenant",
+    help="Snyk API tenant listed here: https://docs.snyk.io/snyk-api/rest-api/about-the-rest-api.  Example: api.snyk.io, api.us.snyk.io, api.eu.snyk.io, api.au.snyk.io.  Default: api.us.snyk.io",
+    envvar="SNYK_API"
+)]
+SnykSourceOrgIdOption = Annotated[str, typer.Option(
+    "--snyk-source-org-id",
+    help="Snyk source org ID",
+    envvar="SNYK_SOURCE_ORG_ID"
+)]
+UseGithubCloudAppIntegrationOption = Annotated[bool, typer.Option(
+    "--use-github-cloud-app-integration",
+    help="Use the GitHub Cloud App integration for the import if it exists. Default: False",
+    is_flag=True,
+    envvar="USE_GITHUB_CLOUD_APP_INTEGRATION"
+)]
+MaxParallelOrgsOption = Annotated[int, typer.Option(
+    "--max-parallel-orgs",
+    help="Number of GitHub orgs to generate import data for and import at the same time. Default: 1",
+    min=1,
+    envvar="MAX_PARALLEL_ORGS"
+)]
+MaxParallelImportsOption = Annotated[int, typer.Option(
+    "--max-parallel-imports",
+    help="Maximum number of snyk-api-import processes running at the same time. Default: --max-parallel-orgs",
+    min=1,
+    envvar="MAX_PARALLEL_IMPORTS"
+)]
+ImportTimeoutOption = Annotated[float, typer.Option(
+    "--import-timeout",
+    help="Seconds after which a snyk-api-import process is stopped and counted as failed. Default: no timeout",
+    min=1,
+    envvar="SNYK_API_IMPORT_TIMEOUT"
+)]
+ImportRetriesOption = Annotated[int, typer.Option(
+    "--import-retries",
+    help="Times a snyk-api-import process that timed out or exited with a failure is retried. Default: 1",
+    min=0,
+    envvar="SNYK_API_IMPORT_RETRIES"
+)]
+HttpPoolSizeOption = Annotated[int, typer.Option(
+    "--http-pool-size",
+    help="Number of pooled keep-alive connections kept open to the Snyk API. Default: 10",
+    min=1,
+    envvar="HTTP_POOL_SIZE"
+)]
+HttpTimeoutOption = Annotated[float, typer.Option(
+    "--http-timeout",
+    help="Timeout in seconds for each Snyk API request. Default: 30",
+    min=1,
+    envvar="HTTP_TIMEOUT"
+)]
+HttpKeepAliveOption = Annotated[bool, typer.Option(
+    "--http-keep-alive/--no-http-keep-alive",
+    help="Reuse connections to the Snyk API between requests. Default: enabled",
+    envvar="HTTP_KEEP_ALIVE"
+)]
+SnykApiConcurrencyOption = Annotated[int, typer.Option(
+    "--snyk-api-concurrency",
+    help="Maximum number of concurrent Snyk API requests when collecting org integrations. Default: 20",
+    min=1,
+    envvar="SNYK_API_CONCURRENCY"
+)]
+GithubOrgResolutionOption = Annotated[str, typer.Option(
+    "--github-org-resolution",
+    help="How GitHub orgs from the CSV are checked.  'list' lists every org the token belongs to.  'targeted' looks up only the orgs named in the CSV, concurrently and with ETag caching, and needs a token with the read:org scope. Default: list",
+    envvar="GITHUB_ORG_RESOLUTION"
+)]
+SnykRequestsPerSecondOption = Annotated[float, typer.Option(
+    "--snyk-requests-per-second",
+    help="Maximum sustained rate of Snyk API requests.  The rate backs off automatically when Snyk returns 429. Default: 25",
+    min=0.1,
+    envvar="SNYK_REQUESTS_PER_SECOND"
+)]
+CacheFileOption = Annotated[str, typer.Option(
+    "--cache-file",
+    help="Path to a SQLite file that persists the Snyk org list and org integrations between runs. Default: in-memory only",
+    envvar="SNYK_IMPORT_CACHE_FILE"
+)]
+CacheTtlOption = Annotated[int, typer.Option(
+    "--cache-ttl",
+    help="Seconds a cached Snyk org list or org integration lookup stays valid. Default: 3600",
+    min=0,
+    envvar="SNYK_IMPORT_CACHE_TTL"
+)]
+FailedTargetsFileOption = Annotated[str, typer.Option(
+    "--failed-targets-file",
+    help="Path of the import file containing only the targets that failed to import. Default: snyk-import-failed-targets.json",
+    envvar="SNYK_IMPORT_FAILED_TARGETS_FILE"
+)]
+BatchSizeOption = Annotated[str, typer.Option(
+    "--batch-size",
+    help="Number of targets imported per batch.  Every batch after the first goes into a new <org>-N Snyk org.  Use 'auto' to pick a size from each org's target count and the measured import throughput. Default: 1000",
+    envvar="SNYK_IMPORT_BATCH_SIZE"
+)]
+ThroughputFileOption = Annotated[str, typer.Option(
+    "--throughput-file",
+    help="Path to the file where measured import throughput is kept for --batch-size=auto. Default: snyk-import-throughput.json",
+    envvar="SNYK_IMPORT_THROUGHPUT_FILE"
+)]
+IncrementalOption = Annotated[bool, typer.Option(
+    "--incremental",
+    help="Only import repos that are not already targets in the Snyk org or its <org>-N orgs. Default: False",
+    is_flag=True
+)]
+OrgProvisioningConcurrencyOption = Annotated[int, typer.Option(
+    "--org-provisioning-concurrency",
+    help="Number of <org>-N Snyk orgs created at the same time for an org's batches 2..N. Default: 5",
+    envvar="SNYK_ORG_PROVISIONING_CONCURRENCY"
+)]
+IntegrationWaitTimeoutOption = Annotated[float, typer.Option(
+    "--integration-wait-timeout",
+    help="Seconds to wait for a new <org>-N org to get its GitHub Enterprise integration. Default: 300",
+    envvar="SNYK_INTEGRATION_WAIT_TIMEOUT"
+)]
+MaxParallelBatchesOption = Annotated[int, typer.Option(
+    "--max-parallel-batches",
+    help="Number of an org's batches imported at the same time.  Limited by --max-parallel-imports. Default: 1",
+    envvar="SNYK_IMPORT_MAX_PARALLEL_BATCHES"
+)]
+MetricsPrometheusFileOption = Annotated[str, typer.Option(
+    "--metrics-prometheus-file",
+    help="Optional path of a Prometheus textfile (for example in the node exporter textfile directory) with the same metrics",
+    envvar="SNYK_IMPORT_METRICS_PROMETHEUS_FILE"
+)]
+ArchiveDirectoryOption = Annotated[str, typer.Option(
+    "--archive-directory",
+    help="Directory where the files of finished imports are archived, one compressed archive with a manifest per run. Default: snyk-import-archive",
+    envvar="SNYK_IMPORT_ARCHIVE_DIRECTORY"
+)]
+ArchiveRetentionDaysOption = Annotated[float, typer.Option(
+    "--archive-retention-days",
+    help="Days archived runs are kept before they are pruned.  0 keeps them forever. Default: 90",
+    min=0,
+    envvar="SNYK_IMPORT_ARCHIVE_RETENTION_DAYS"
+)]
+
+# Yield the CSV mappings whose GitHub and Snyk orgs both exist.  GitHub orgs are resolved a chunk of rows
+# at a time with resolve_github_orgs(names) -> {name: org}.  Orgs a resumed run already finished are left
+# out so they don't need their GitHub lookup, integrations or import data again, and are handed to
+# on_finished(github_org_name) instead.
+def iter_matches(csv_mappings, resolve_github_orgs, group_org_index, journal=None, chunk_size=20, on_finished=None):
+    for chunk in iter_chunks(csv_mappings, chunk_size):
+        if journal:
+            finished = [mapping for mapping in chunk if journal.has(mapping['github_org_name'], IMPORTED)]
+            if on_finished:
+                for mapping in finished:
+                    on_finished(mapping['github_org_name'])
+            chunk = [mapping for mapping in chunk if mapping not in finished]
+        github_org_dict = resolve_github_orgs([mapping['github_org_name'] for mapping in chunk])
+
+        for mapping in chunk:
+            github_org_name = mapping['github_org_name']
+            snyk_org = mapping['snyk_org_name']
+
+            # Check if we have matches in both GitHub and Snyk
+            if (github_org_name in github_org_dict and 
+                snyk_org in group_org_index):
+                yield {
+                    'github_org_name': github_org_name,
+                    'snyk_org_id': group_org_index.get(snyk_org)['id']
+                }
+            else:
+                print(f"Skipping CSV line {mapping['line_number']}: no matching GitHub org {github_org_name} or Snyk org {snyk_org}")
+
+# List every GitHub org the token belongs to, timed as the github_orgs phase
+def timed_list_organizations(github_token):
+    from apis.githubapi import list_organizations
+
+    with run_metrics.timer('github_orgs'):
+        return list_organizations(github_token)
+
+# Return resolve_github_orgs(names) -> {name: org} for iter_matches.  With 'list' every org the token
+# belongs to is listed once, on the first call unless the listing is passed in as github_orgs.  With
+# relist_unseen, a long-lived resolver lists them again when it is asked for a name it has not been asked
+# for before and that is not in the listing, so orgs the token joined later are found.  With 'targeted'
+# each chunk of names is looked up on its own.
+def github_org_resolver(github_token, github_org_resolution, github_orgs=None, relist_unseen=False):
+    if github_org_resolution == "list":
+        github_org_dict = None
+        seen_names = set()
+
+        def resolve_github_orgs(github_org_names):
+            nonlocal github_org_dict
+            if github_org_dict is None:
+                github_org_dict = {org['login']: org for org in (github_orgs if github_orgs is not None else timed_list_organizations(github_token))}
+            elif relist_unseen and any(name not in seen_names and name not in github_org_dict for name in github_org_names):
+                github_org_dict = {org['login']: org for org in timed_list_organizations(github_token)}
+            seen_names.update(github_org_names)
+            return github_org_dict
+        return resolve_github_orgs
+
+    from apis.githubapi import resolve_organizations
+
+    def resolve_github_orgs(github_org_names):
+        with run_metrics.timer('github_orgs'):
+            return resolve_organizations(github_token, github_org_names)
+    return resolve_github_orgs
+
+# Create a job workspace with its snyk-created-orgs.json for each match.  Integrations are fetched for a
+# chunk of matches at a time, so the lookups stay concurrent while the first orgs can already be imported.
+def iter_job_workspaces(matches, run_directory, workspaces, group_id, snyk_api_tenant, snyk_api_concurrency):
+    from apis.snykAsyncApi import fetch_org_integrations
+    from utils.utils import writeJsonFile
+
+    for chunk in iter_chunks(matches, snyk_api_concurrency):
+        with run_metrics.timer('org_integrations'):
+            snyk_integrations_by_org = fetch_org_integrations([match['snyk_org_id'] for match in chunk], snyk_api_tenant, snyk_api_concurrency)
+        for match in chunk:
+            orgData = {
+                "name": match['github_org_name'],
+                "orgId": match['snyk_org_id'],
+                "integrations": snyk_integrations_by_org[match['snyk_org_id']],
+                "groupId": group_id
+            }
+            workspace = JobWorkspace(run_directory, orgData['name'])
+            writeJsonFile({"orgData": [orgData]}, workspace.org_data_file)
+            workspaces.append(workspace)
+            yield workspace
+
+@dataclass(frozen=True)
+class WatchSettings:
+    """
+    Settings of the imports a watch runs, built once from the watch command's options
+    """
+    run_directory: str
+    checkpoint_file: str
+    group_id: str
+    snyk_api_import_name: str
+    snyk_api_tenant: str
+    snyk_source_org_id: str
+    use_github_cloud_app_integration: bool
+    max_parallel_orgs: int
+    snyk_api_concurrency: int
+    batch_size: int | str
+    incremental: bool
+    org_provisioning_concurrency: int
+    integration_wait_timeout: float
+    max_parallel_batches: int
+    results_file: str
+    failed_targets_file: str
+    metrics_file: str
+    metrics_prometheus_file: str | None
+    archive: RunArchive
+
+# Validate snyk_api_tenant
+def check_snyk_api_tenant(snyk_api_tenant):
+    valid_tenants = ["api.snyk.io", "api.us.snyk.io", "api.eu.snyk.io", "api.au.snyk.io"]
+    if snyk_api_tenant not in valid_tenants:
+        typer.echo(f"Error: Invalid Snyk API tenant. Must be one of: {', '.join(valid_tenants)}")
+        raise typer.Exit(1)
+
+def check_github_org_resolution(github_org_resolution):
+    if github_org_resolution not in ("list", "targeted"):
+        typer.echo("Error: Invalid GitHub org resolution. Must be one of: list, targeted")
+        raise typer.Exit(1)
+
+def check_batch_size(batch_size):
+    try:
+        return parse_batch_size(batch_size)
+    except ValueError:
+        typer.echo(f"Error: Invalid batch size {batch_size}. Must be a positive number or 'auto'")
+        raise typer.Exit(1)
+
+def check_shard(shard_index, shard_count):
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        typer.echo(f"Error: Invalid shard {shard_index} of {shard_count}. Shard index must be from 0 to shard count - 1")
+        raise typer.Exit(1)
+
+# Archive the files of the workspaces that completed and remove them.  Unfinished workspaces stay in
+# place so their generated import data can be picked up again.
+def clean_up_workspaces(workspaces, failed_workspaces, run_directory, archive=None):
+    from utils.utils import clean_up
+
+    with run_metrics.timer('clean_up'):
+        completed_workspaces = [workspace for workspace in workspaces if workspace not in failed_workspaces]
+        clean_up({
+            # The retry pass workspace has no org data file of its own
+            'json': [workspace.org_data_file for workspace in completed_workspaces if os.path.isfile(workspace.org_data_file)],
+            'log': [log_file for workspace in completed_workspaces for log_file in workspace.log_files()],
+            'import': [import_file for workspace in completed_workspaces for import_file in workspace.import_files()],
+        }, run_directory, archive)
+        for workspace in completed_workspaces:
+            workspace.remove()
+
+# Read an import plan and make sure it was made for this CSV file, group, tenant and import settings.  Its
+# batch sizes and <org>-N orgs were counted with --incremental and --use-github-cloud-app-integration as
+# they were then, so a run with other settings would import with the wrong batches.
+def check_plan_file(plan_file, csv_file_path, group_id, snyk_api_tenant, incremental, use_github_cloud_app_integration):
+    from utils.planner import read_plan
+
+    try:
+        plan = read_plan(plan_file)
+    except Exception as e:
+        typer.echo(f"Error: Could not read plan file {plan_file}: {str(e)}")
+        raise typer.Exit(1)
+    if plan['group_id'] != group_id or plan['snyk_api_tenant'] != snyk_api_tenant:
+        typer.echo(f"Error: Plan file {plan_file} was made for group {plan['group_id']} on {plan['snyk_api_tenant']}")
+        raise typer.Exit(1)
+    if plan['csv_sha256'] != file_sha256(csv_file_path):
+        typer.echo(f"Error: {csv_file_path} changed since plan file {plan_file} was made.  Run plan again.")
+        raise typer.Exit(1)
+    if plan['incremental'] != incremental or plan['use_github_cloud_app_integration'] != use_github_cloud_app_integration:
+        typer.echo(f"Error: Plan file {plan_file} was made with incremental={plan['incremental']} and use_github_cloud_app_integration={plan['use_github_cloud_app_integration']}.  Run with the same settings or run plan again.")
+        raise typer.Exit(1)
+    return plan
+
+# Print the cache and rate limiter summaries and write the timing report
+def write_run_report(metrics_file, metrics_prometheus_file=None):
+    print(api_cache.describe())
+    print(snyk_rate_limiter.describe())
+    print(github_rate_limiter.describe())
+
+    try:
+        run_metrics.write_json(metrics_file)
+        if metrics_prometheus_file:
+            run_metrics.write_prometheus(metrics_prometheus_file)
+        print(run_metrics.describe())
+        print(f"Metrics written to {metrics_file}")
+    except Exception as e:
+        print(f"Error in writing metrics: {str(e)}")
+
 @app.command(name="run-snyk-api-import")
 def run_snyk_api_import(
-    csv_file_path: str = typer.Option(
-        ...,
-        "--csv-file-path",
-        help="Path to the CSV file containing GitHub organization mappings",
-        exists=True,
-        file_okay=True,
-        dir_okay=False,
-        readable=True
-    ),
-    github_token: str = typer.Option(
-        ...,
-        "--github-token",
-        help="GitHub personal access token for authentication",
-        envvar="GITHUB_TOKEN"
-    ),
-    group_id: str = typer.Option(
-        ...,
-        "--group-id",
-        help="Snyk group ID",
-        envvar="SNYK_GROUP_ID"
-    ),
-    snyk_api_import_name: str = typer.Option(
-        ...,
-        "--snyk-api-import-name",
-        help="Name of the Snyk API import binary in root directory https://github.com/snyk/snyk-api-import/releases",
-        exists=True,
-        file_okay=True,
-        dir_okay=False,
-        readable=True
-    ),
-    snyk_api_tenant: str = typer.Option(
-        "api.us.snyk.io",  # Set default value
-        "--snyk-api-tenant",
-        help="Snyk API tenant listed here: https://docs.snyk.io/snyk-api/rest-api/about-the-rest-api.  Example: api.snyk.io, api.us.snyk.io, api.eu.snyk.io, api.au.snyk.io.  Default: api.us.snyk.io",
-        envvar="SNYK_API"
-    ),
-    snyk_source_org_id: str = typer.Option(
-        ...,
-        "--snyk-source-org-id",
-        help="Snyk source org ID",
-        envvar="SNYK_SOURCE_ORG_ID"
-    ),
-    use_github_cloud_app_integration: bool = typer.Option(
+    csv_file_path: CsvFilePathOption,
+    github_token: GithubTokenOption,
+    group_id: GroupIdOption,
+    snyk_api_import_name: SnykApiImportNameOption,
+    snyk_source_org_id: SnykSourceOrgIdOption,
+    snyk_api_tenant: SnykApiTenantOption = "api.us.snyk.io",
+    use_github_cloud_app_integration: UseGithubCloudAppIntegrationOption = False,
+    max_parallel_orgs: MaxParallelOrgsOption = 1,
+    max_parallel_imports: MaxParallelImportsOption = None,
+    import_timeout: ImportTimeoutOption = None,
+    import_retries: ImportRetriesOption = 1,
+    http_pool_size: HttpPoolSizeOption = 10,
+    http_timeout: HttpTimeoutOption = 30,
+    http_keep_alive: HttpKeepAliveOption = True,
+    snyk_api_concurrency: SnykApiConcurrencyOption = 20,
+    github_org_resolution: GithubOrgResolutionOption = "list",
+    snyk_requests_per_second: SnykRequestsPerSecondOption = 25,
+    cache_file: CacheFileOption = None,
+    cache_ttl: CacheTtlOption = 3600,
+    clear_cache: bool = typer.Option(
         False,
-        "--use-github-cloud-app-integration",
-        help="Use the GitHub Cloud App integration for the import if it exists. Default: False",
-        is_flag=True,
-        envvar="USE_GITHUB_CLOUD_APP_INTEGRATION"
+        "--clear-cache",
+        help="Drop every persisted cache entry before the run. Default: False",
+        is_flag=True
+    ),
+    results_file: str = typer.Option(
+        "snyk-import-results.json",
+        "--results-file",
+        help="Path of the JSON summary of imported and failed targets per GitHub org and Snyk org. Default: snyk-import-results.json",
+        envvar="SNYK_IMPORT_RESULTS_FILE"
+    ),
+    failed_targets_file: FailedTargetsFileOption = "snyk-import-failed-targets.json",
+    retry_failed_targets: bool = typer.Option(
+        False,
+        "--retry-failed-targets",
+        help="Run one more snyk-api-import pass with only the targets that failed. Default: False",
+        is_flag=True
+    ),
+    checkpoint_file: str = typer.Option(
+        "snyk-import-checkpoint.jsonl",
+        "--checkpoint-file",
+        help="Path to the journal recording which orgs and batches have been generated, split, had orgs created and imported. Default: snyk-import-checkpoint.jsonl",
+        envvar="SNYK_IMPORT_CHECKPOINT_FILE"
+    ),
+    resume: bool = typer.Option(
+        False,
+        "--resume",
+        help="Continue an interrupted run from the checkpoint journal, skipping orgs and batches that already finished. Default: False",
+        is_flag=True
+    ),
+    batch_size: BatchSizeOption = "1000",
+    throughput_file: ThroughputFileOption = "snyk-import-throughput.json",
+    org_provisioning_concurrency: OrgProvisioningConcurrencyOption = 5,
+    integration_wait_timeout: IntegrationWaitTimeoutOption = 300,
+    max_parallel_batches: MaxParallelBatchesOption = 1,
+    incremental: IncrementalOption = False,
+    metrics_file: str = typer.Option(
+        "snyk-import-metrics.json",
+        "--metrics-file",
+        help="Path of the JSON report with per-phase and per-org timings, HTTP request counts and latencies, and snyk-api-import wall time. Default: snyk-import-metrics.json",
+        envvar="SNYK_IMPORT_METRICS_FILE"
+    ),
+    metrics_prometheus_file: MetricsPrometheusFileOption = None,
+    archive_directory: ArchiveDirectoryOption = DEFAULT_ARCHIVE_DIRECTORY,
+    archive_retention_days: ArchiveRetentionDaysOption = DEFAULT_RETENTION_DAYS,
+    plan_file: str = typer.Option(
+        None,
+        "--plan-file",
+        help="Import the orgs of a plan made with the plan command, using its generated import data and batch sizes instead of matching the CSV file again",
+        envvar="SNYK_IMPORT_PLAN_FILE"
+    ),
+    shard_index: int = typer.Option(
+        0,
+        "--shard-index",
+        help="Shard this node imports, from 0 to --shard-count - 1. Default: 0",
+        envvar="SNYK_IMPORT_SHARD_INDEX"
+    ),
+    shard_count: int = typer.Option(
+        1,
+        "--shard-count",
+        help="Number of nodes the CSV file is split across by a hash of the Snyk org of each row.  Each shard gets its own checkpoint, workspaces, results and metrics files. Default: 1",
+        envvar="SNYK_IMPORT_SHARD_COUNT"
     )
 ):
     """
     Process the CSV file containing GitHub organization mappings and create organization data for Snyk API import.
     """
-    # Validate snyk_api_tenant
-    valid_tenants = ["api.snyk.io", "api.us.snyk.io", "api.eu.snyk.io", "api.au.snyk.io"]
-    if snyk_api_tenant not in valid_tenants:
-        typer.echo(f"Error: Invalid Snyk API tenant. Must be one of: {', '.join(valid_tenants)}")
+    check_snyk_api_tenant(snyk_api_tenant)
+    batch_size = check_batch_size(batch_size)
+    check_shard(shard_index, shard_count)
+    check_github_org_resolution(github_org_resolution)
+    throughput_tracker.load(throughput_file)
+
+    # Every shard keeps its own journal, workspaces and reports, so shards can share a directory
+    if shard_count > 1:
+        checkpoint_file, results_file, failed_targets_file, metrics_file = (shard_path(path, shard_index, shard_count) for path in (checkpoint_file, results_file, failed_targets_file, metrics_file))
+        if metrics_prometheus_file:
+            metrics_prometheus_file = shard_path(metrics_prometheus_file, shard_index, shard_count)
+        print(f"Importing shard {shard_index} of {shard_count}")
+
+    # Fail on an unreadable CSV file before any API calls are made
+    run_metrics.reset()
+    with run_metrics.timer('csv_check'):
+        check_csv_file(csv_file_path)
+
+    from apis.snykApi import configure_snyk_client
+    from apis.snykAsyncApi import fetch_snyk_orgs
+    # Imported under another name, this command is called run_snyk_api_import too
+    from utils.planner import apply_planned_org
+    from utils.utils import import_repos, run_snyk_api_import as run_snyk_api_import_process
+
+    plan = check_plan_file(plan_file, csv_file_path, group_id, snyk_api_tenant, incremental, use_github_cloud_app_integration) if plan_file else None
+    try:
+        configure_snyk_client(http_pool_size, http_timeout, http_keep_alive)
+    except ValueError as e:
+        typer.echo(f"Error: {str(e)}")
         raise typer.Exit(1)
+    process_runner.configure(max_parallel_imports or max_parallel_orgs, import_timeout, import_retries)
+    journal = CheckpointJournal(checkpoint_file, resume)
+    snyk_rate_limiter.configure(snyk_requests_per_second)
+    api_cache.configure(cache_ttl, cache_file)
+    if clear_cache:
+        api_cache.clear()
     
-    # Read the CSV file
-    csv_data = read_csv_file(csv_file_path)
-    typer.echo(f"Successfully read CSV file with {len(csv_data)} entries")
+    # GitHub and Snyk orgs are independent, so when every GitHub org is listed that happens in a thread
+    # while the Snyk orgs are collected.  Targeted resolution only looks up the orgs named in the CSV, and
+    # a plan already holds its matched orgs.
+    list_github_orgs = github_org_resolution == "list" and plan is None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        if list_github_orgs:
+            github_orgs_future = executor.submit(timed_list_organizations, github_token)
+
+        try:
+            # Get all organizations using the snykAsyncApi module from apis package
+            with run_metrics.timer('snyk_orgs'):
+                snyk_orgs = fetch_snyk_orgs(group_id, snyk_api_tenant)
+            print("Collected Snyk orgs")
+        except Exception as e:
+            print(f"Error in collecting Snyk orgs: {str(e)}")
+            raise typer.Exit(1)
+
+        if list_github_orgs:
+            try:
+                # Get all organizations using the githubapi module from apis package
+                github_orgs = github_orgs_future.result()
+                print("Collected GitHub orgs")
+            except Exception as e:
+                print(f"Error in collecting GitHub orgs: {str(e)}")
+                raise typer.Exit(1)
+
+    # Create lookup dictionaries.  The Snyk org index is keyed by name and slug and is shared with the
+    # import so <org>-N lookups and newly created orgs use the same index.
+    resolve_github_orgs = github_org_resolver(github_token, github_org_resolution, github_orgs if list_github_orgs else None)
+    group_org_index = GroupOrgIndex(snyk_orgs)
+
+    # Rows are sharded on their Snyk org, so every GitHub org of a Snyk org is imported on one node and
+    # only that node creates the <org>-N orgs named after it
+    def in_shard(snyk_org_name_or_id):
+        snyk_org = group_org_index.get(snyk_org_name_or_id)
+        return shard_of(snyk_org['id'] if snyk_org else snyk_org_name_or_id, shard_count) == shard_index
+
+    # Write each org's org data into its own job workspace as CSV rows are read and matched.  Workspaces
+    # left by an earlier unfinished run are only kept for --resume, otherwise their logs would be read
+    # into this run's results and archived with it.
+    run_directory = f'{checkpoint_file}.workspaces'
+    if not resume:
+        shutil.rmtree(run_directory, ignore_errors=True)
+    run_directory = create_run_directory(run_directory)
+    workspaces = []
+
+    # Orgs that finished before a resumed run was interrupted are not imported again, but the workspaces
+    # they left are read into the results and archived with this run
+    def reopen_finished_workspace(github_org_name):
+        workspace = existing_workspace(run_directory, github_org_name)
+        if workspace is not None:
+            split = journal.details(github_org_name, SPLIT)
+            workspace.batch_files = [f for f in split['batch_files'] if f != workspace.import_targets_file] if split else []
+            workspaces.append(workspace)
+
+    if plan is not None:
+        planned_orgs = {org_plan['github_org_name']: org_plan for org_plan in plan['orgs'] if org_plan['import_targets_file'] and in_shard(org_plan['snyk_org_id'])}
+        print(f"Importing {len(planned_orgs)} orgs from plan file {plan_file}")
+        planned_mappings = [{'github_org_name': name, 'snyk_org_id': org_plan['snyk_org_id']} for name, org_plan in planned_orgs.items()]
+        if resume:
+            for mapping in planned_mappings:
+                if journal.has(mapping['github_org_name'], IMPORTED):
+                    reopen_finished_workspace(mapping['github_org_name'])
+        matches = (mapping for mapping in planned_mappings if not (resume and journal.has(mapping['github_org_name'], IMPORTED)))
+        job_workspaces = (apply_planned_org(workspace, planned_orgs[workspace.github_org_name], journal) for workspace in iter_job_workspaces(matches, run_directory, workspaces, group_id, snyk_api_tenant, snyk_api_concurrency))
+    else:
+        csv_mappings = (mapping for mapping in iter_csv_mappings(csv_file_path) if in_shard(mapping['snyk_org_name']))
+        matches = iter_matches(run_metrics.timed_iter('csv_read', csv_mappings), resolve_github_orgs, group_org_index, journal if resume else None, snyk_api_concurrency, reopen_finished_workspace)
+        job_workspaces = iter_job_workspaces(matches, run_directory, workspaces, group_id, snyk_api_tenant, snyk_api_concurrency)
     
-    snykApiImportOrgDataObject = []
+    # Import the json files.  When the import stops with an error every workspace is kept for --resume.
+    failed_workspaces = None
+    try:
+        failed_workspaces = import_repos(job_workspaces, snyk_api_import_name, snyk_api_tenant, group_id, snyk_source_org_id, use_github_cloud_app_integration, max_parallel_orgs, journal, batch_size, group_org_index, incremental, org_provisioning_concurrency, integration_wait_timeout, max_parallel_batches)
+    except Exception as e:
+        print(f"Error in importing repos: {str(e)} \n Continuing with cleanup...")
+    finally:
+        journal.close()
+    if failed_workspaces is None:
+        failed_workspaces = list(workspaces)
+
+    # Index per-target results from the snyk-api-import logs and optionally retry only the failed targets
+    try:
+        with run_metrics.timer('import_logs'):
+            failed_target_count = ingest_import_logs(workspaces, results_file, failed_targets_file, resume)
+        if failed_target_count and retry_failed_targets:
+            print(f"Retrying {failed_target_count} failed targets")
+            retry_workspace = JobWorkspace(run_directory, 'retry-failed-targets')
+            with run_metrics.timer('retry_import'):
+                result = run_snyk_api_import_process(retry_workspace, snyk_api_import_name, snyk_api_tenant, 'import', f'--file={os.path.abspath(failed_targets_file)}')
+            print(f"Retry pass {result.describe()}")
+            ingest_import_logs(workspaces, results_file, failed_targets_file, resume, [retry_workspace])
+            # Archived and removed with the org workspaces
+            workspaces.append(retry_workspace)
+    except Exception as e:
+        print(f"Error in reading import logs: {str(e)}")
     
+    # Clean up the json and log files.  Workspaces of orgs that did not finish stay in place for --resume.
     try:
-        # Get all organizations using the githubapi module from apis package
-        github_orgs = list_organizations(github_token)
-        print("Collected GitHub orgs")
+        clean_up_workspaces(workspaces, failed_workspaces, run_directory, RunArchive(archive_directory, archive_retention_days))
+        if failed_workspaces:
+            print(f"Kept {len(failed_workspaces)} unfinished workspaces in {run_directory}.  Re-run with --resume to continue them.")
+        elif not os.listdir(run_directory):
+            os.rmdir(run_directory)
     except Exception as e:
-        print(f"Error in collecting GitHub orgs: {str(e)}")
+        print(f"Error in cleaning up json files: {str(e)}")
         raise typer.Exit(1)
-        
+
+    write_run_report(metrics_file, metrics_prometheus_file)
+
+@app.command(name="watch")
+def watch(
+    csv_file_path: CsvFilePathOption,
+    github_token: GithubTokenOption,
+    group_id: GroupIdOption,
+    snyk_api_import_name: SnykApiImportNameOption,
+    snyk_source_org_id: SnykSourceOrgIdOption,
+    snyk_api_tenant: SnykApiTenantOption = "api.us.snyk.io",
+    use_github_cloud_app_integration: UseGithubCloudAppIntegrationOption = False,
+    poll_interval: float = typer.Option(
+        60,
+        "--poll-interval",
+        help="Seconds between checks of the CSV file for changes. Default: 60",
+        envvar="SNYK_IMPORT_POLL_INTERVAL"
+    ),
+    retry_interval: float = typer.Option(
+        3600,
+        "--retry-interval",
+        help="Seconds after which rows that failed to import are tried again even if the CSV file did not change. Default: 3600",
+        envvar="SNYK_IMPORT_RETRY_INTERVAL"
+    ),
+    watch_state_file: str = typer.Option(
+        "snyk-import-watch-state.json",
+        "--watch-state-file",
+        help="Path to the file recording which CSV rows have been imported. Default: snyk-import-watch-state.json",
+        envvar="SNYK_IMPORT_WATCH_STATE_FILE"
+    ),
+    max_parallel_orgs: MaxParallelOrgsOption = 1,
+    max_parallel_imports: MaxParallelImportsOption = None,
+    import_timeout: ImportTimeoutOption = None,
+    import_retries: ImportRetriesOption = 1,
+    http_pool_size: HttpPoolSizeOption = 10,
+    http_timeout: HttpTimeoutOption = 30,
+    http_keep_alive: HttpKeepAliveOption = True,
+    snyk_api_concurrency: SnykApiConcurrencyOption = 20,
+    github_org_resolution: GithubOrgResolutionOption = "list",
+    snyk_requests_per_second: SnykRequestsPerSecondOption = 25,
+    cache_file: CacheFileOption = None,
+    cache_ttl: CacheTtlOption = 3600,
+    checkpoint_file: str = typer.Option(
+        "snyk-import-watch-checkpoint.jsonl",
+        "--checkpoint-file",
+        help="Path to the checkpoint journal of the import in progress, so a restarted watch continues it. Default: snyk-import-watch-checkpoint.jsonl",
+        envvar="SNYK_IMPORT_CHECKPOINT_FILE"
+    ),
+    batch_size: BatchSizeOption = "1000",
+    throughput_file: ThroughputFileOption = "snyk-import-throughput.json",
+    org_provisioning_concurrency: OrgProvisioningConcurrencyOption = 5,
+    integration_wait_timeout: IntegrationWaitTimeoutOption = 300,
+    max_parallel_batches: MaxParallelBatchesOption = 1,
+    incremental: IncrementalOption = False,
+    results_file: str = typer.Option(
+        "snyk-import-results.json",
+        "--results-file",
+        help="Path of the per-org import summary written after each import. Default: snyk-import-results.json",
+        envvar="SNYK_IMPORT_RESULTS_FILE"
+    ),
+    failed_targets_file: FailedTargetsFileOption = "snyk-import-failed-targets.json",
+    archive_directory: ArchiveDirectoryOption = DEFAULT_ARCHIVE_DIRECTORY,
+    archive_retention_days: ArchiveRetentionDaysOption = DEFAULT_RETENTION_DAYS,
+    metrics_file: str = typer.Option(
+        "snyk-import-metrics.json",
+        "--metrics-file",
+        help="Path of the JSON timing report written after each import. Default: snyk-import-metrics.json",
+        envvar="SNYK_IMPORT_METRICS_FILE"
+    ),
+    metrics_prometheus_file: MetricsPrometheusFileOption = None
+):
+    """
+    Keep running and import the CSV rows that are added or changed.  Org indexes, API caches and HTTP
+    connections stay warm between imports.
+    """
+    check_snyk_api_tenant(snyk_api_tenant)
+    batch_size = check_batch_size(batch_size)
+    check_github_org_resolution(github_org_resolution)
+    throughput_tracker.load(throughput_file)
+    check_csv_file(csv_file_path)
+
+    from apis.snykApi import configure_snyk_client
+    from apis.snykAsyncApi import fetch_snyk_orgs
+
+    try:
+        configure_snyk_client(http_pool_size, http_timeout, http_keep_alive)
+    except ValueError as e:
+        typer.echo(f"Error: {str(e)}")
+        raise typer.Exit(1)
+    process_runner.configure(max_parallel_imports or max_parallel_orgs, import_timeout, import_retries)
+    snyk_rate_limiter.configure(snyk_requests_per_second)
+    api_cache.configure(cache_ttl, cache_file)
+
     try:
-        # Get all organizations using the snykapi module from apis package
-        snyk_orgs = get_snyk_orgs(group_id, snyk_api_tenant)
-        print("Collected Snyk orgs")
+        group_org_index = GroupOrgIndex(fetch_snyk_orgs(group_id, snyk_api_tenant))
     except Exception as e:
         print(f"Error in collecting Snyk orgs: {str(e)}")
         raise typer.Exit(1)
 
-    # Create lookup dictionaries
-    github_org_dict = {org['login']: org for org in github_orgs}
-    snyk_org_dict = {}
-    for org in snyk_orgs:
-    # Add entry with slug as key
-        snyk_org_dict[org['attributes']['slug']] = org
-        # Add entry with name as key
-        snyk_org_dict[org['attributes']['name']] = org
-        
-        # Store matches
-        matches = []
+    watcher = CsvWatcher(csv_file_path, watch_state_file)
+    # One resolver for the whole watch.  In list mode it lists the GitHub orgs again only for rows naming
+    # an org it has not been asked for yet.
+    resolve_github_orgs = github_org_resolver(github_token, github_org_resolution, relist_unseen=True)
+    settings = WatchSettings(
+        run_directory=create_run_directory(f'{checkpoint_file}.workspaces'),
+        checkpoint_file=checkpoint_file,
+        group_id=group_id,
+        snyk_api_import_name=snyk_api_import_name,
+        snyk_api_tenant=snyk_api_tenant,
+        snyk_source_org_id=snyk_source_org_id,
+        use_github_cloud_app_integration=use_github_cloud_app_integration,
+        max_parallel_orgs=max_parallel_orgs,
+        snyk_api_concurrency=snyk_api_concurrency,
+        batch_size=batch_size,
+        incremental=incremental,
+        org_provisioning_concurrency=org_provisioning_concurrency,
+        integration_wait_timeout=integration_wait_timeout,
+        max_parallel_batches=max_parallel_batches,
+        results_file=results_file,
+        failed_targets_file=failed_targets_file,
+        metrics_file=metrics_file,
+        metrics_prometheus_file=metrics_prometheus_file,
+        archive=RunArchive(archive_directory, archive_retention_days),
+    )
+    last_attempt = None
+    pending_failures = False
+    print(f"Watching {csv_file_path} for changes every {poll_interval:.0f} seconds, {len(watcher.imported_rows)} rows already imported")
+
     try:
-        # Compare CSV entries with both GitHub and Snyk orgs
-        for row in csv_data:
-            github_org_name = row['GitHub-Org-Name']
-            snyk_org = row['Snyk-Org-Name']
-            
-            # Check if we have matches in both GitHub and Snyk
-            if (github_org_name in github_org_dict and 
-                snyk_org in snyk_org_dict):
-                matches.append({
-                    'github_org_name': github_org_name,
-                    'snyk_org_id': snyk_org_dict[snyk_org]['id']
-                })
-        
-        for match in matches:
-            snykIntegrations = get_org_integrations(match['snyk_org_id'], snyk_api_tenant)
-            newSnykApiImportOrgDataObject = {
-                    "name": match['github_org_name'],
-                    "orgId": match['snyk_org_id'],
-                    "integrations": snykIntegrations,
-                    "groupId": group_id
-                }
-            snykApiImportOrgDataObject.append(newSnykApiImportOrgDataObject)
-            
+        while True:
+            retry_due = pending_failures and time.monotonic() - last_attempt >= retry_interval
+            if watcher.changed() or retry_due:
+                last_attempt = time.monotonic()
+                pending_failures = import_changed_rows(watcher, group_org_index, resolve_github_orgs, settings)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+# Import the rows of the CSV file that were added or changed since they were last imported.  Returns
+# True when some rows did not import and should be tried again.
+def import_changed_rows(watcher: CsvWatcher, group_org_index: GroupOrgIndex, resolve_github_orgs, settings: WatchSettings):
+    from apis.snykApi import SNYK_ORGS_CACHE
+    from apis.snykAsyncApi import fetch_snyk_orgs
+    from utils.utils import import_repos
+
+    run_metrics.reset()
+    with run_metrics.timer('csv_read'):
+        mappings = watcher.pending_mappings()
+    if not mappings:
+        print("CSV file changed, no rows to import")
+        return False
+    print(f"Importing {len(mappings)} added or changed rows")
+
+    # Orgs created in Snyk since the index was built are picked up with one fresh listing
+    if any(mapping['snyk_org_name'] not in group_org_index for mapping in mappings):
+        api_cache.invalidate(SNYK_ORGS_CACHE, cache_key(settings.snyk_api_tenant, settings.group_id))
+        with run_metrics.timer('snyk_orgs'):
+            for org in fetch_snyk_orgs(settings.group_id, settings.snyk_api_tenant):
+                group_org_index.add(org)
+
+    # The journal only covers the import in progress: a restarted watch resumes it, a finished one resets it.
+    # Rows whose Snyk org changed while their import was unfinished start over, so progress journaled for
+    # the old org is not counted for the new one.
+    journal = CheckpointJournal(settings.checkpoint_file, resume=True)
+    for mapping in watcher.mark_started(mappings):
+        print(f"Snyk org of {mapping['github_org_name']} changed to {mapping['snyk_org_name']}, starting its import again")
+        journal.forget(mapping['github_org_name'])
+        JobWorkspace(settings.run_directory, mapping['github_org_name']).remove()
+    workspaces = []
+    failed_workspaces = None
+    try:
+        matches = iter_matches(mappings, resolve_github_orgs, group_org_index, journal, settings.snyk_api_concurrency)
+        job_workspaces = iter_job_workspaces(matches, settings.run_directory, workspaces, settings.group_id, settings.snyk_api_tenant, settings.snyk_api_concurrency)
+        failed_workspaces = import_repos(
+            job_workspaces, settings.snyk_api_import_name, settings.snyk_api_tenant, settings.group_id, settings.snyk_source_org_id, settings.use_github_cloud_app_integration,
+            max_parallel_orgs=settings.max_parallel_orgs,
+            journal=journal,
+            batch_size=settings.batch_size,
+            group_org_index=group_org_index,
+            incremental=settings.incremental,
+            provisioning_concurrency=settings.org_provisioning_concurrency,
+            integration_wait_seconds=settings.integration_wait_timeout,
+            max_parallel_batches=settings.max_parallel_batches
+        )
     except Exception as e:
-        print(f"Error in processing: {str(e)}")
-        raise typer.Exit(1)
-    
-    # Write the snykApiImportOrgDataObject to a json file
+        print(f"Error in importing repos: {str(e)}")
+    if failed_workspaces is None:
+        failed_workspaces = list(workspaces)
+
+    failed_org_names = {workspace.github_org_name for workspace in failed_workspaces}
+    imported_org_names = {workspace.github_org_name for workspace in workspaces if workspace.github_org_name not in failed_org_names}
+    imported_mappings = [mapping for mapping in mappings if mapping['github_org_name'] in imported_org_names or journal.has(mapping['github_org_name'], IMPORTED)]
+    journal.close()
+    watcher.mark_imported(imported_mappings)
+
     try:
-        for index, orgData in enumerate(snykApiImportOrgDataObject):
-            snykApiImportOrgDataObject = {"orgData": [orgData]}
-            writeJsonFile(snykApiImportOrgDataObject, index)
+        with run_metrics.timer('import_logs'):
+            ingest_import_logs(workspaces, settings.results_file, settings.failed_targets_file, keep_previous=True)
+        clean_up_workspaces(workspaces, failed_workspaces, settings.run_directory, settings.archive)
     except Exception as e:
-        print(f"Error in creating org data json files: {str(e)}")
-        raise typer.Exit(1)
-    
-    # Find the json files
+        print(f"Error in cleaning up: {str(e)}")
+
+    pending = len(mappings) - len(imported_mappings)
+    if pending:
+        print(f"{pending} rows did not import and will be tried again")
+    else:
+        CheckpointJournal(settings.checkpoint_file, resume=False).close()
+    print(f"Imported {len(imported_mappings)} rows")
+    write_run_report(settings.metrics_file, settings.metrics_prometheus_file)
+    return pending > 0
+
+@app.command(name="plan")
+def plan(
+    csv_file_path: CsvFilePathOption,
+    github_token: GithubTokenOption,
+    group_id: GroupIdOption,
+    snyk_api_import_name: SnykApiImportNameOption,
+    snyk_api_tenant: SnykApiTenantOption = "api.us.snyk.io",
+    use_github_cloud_app_integration: UseGithubCloudAppIntegrationOption = False,
+    plan_file: str = typer.Option(
+        "snyk-import-plan.json",
+        "--plan-file",
+        help="Path of the JSON plan.  Generated import data is kept next to it in <plan-file>.workspaces for run-snyk-api-import --plan-file. Default: snyk-import-plan.json",
+        envvar="SNYK_IMPORT_PLAN_FILE"
+    ),
+    max_parallel_orgs: int = typer.Option(
+        1,
+        "--max-parallel-orgs",
+        help="Number of GitHub orgs to generate import data for at the same time, and to import at the same time in the projected runtime. Default: 1",
+        min=1,
+        envvar="MAX_PARALLEL_ORGS"
+    ),
+    max_parallel_imports: MaxParallelImportsOption = None,
+    max_parallel_batches: int = typer.Option(
+        1,
+        "--max-parallel-batches",
+        help="Number of an org's batches imported at the same time in the projected runtime. Default: 1",
+        envvar="SNYK_IMPORT_MAX_PARALLEL_BATCHES"
+    ),
+    snyk_api_concurrency: SnykApiConcurrencyOption = 20,
+    github_org_resolution: GithubOrgResolutionOption = "list",
+    snyk_requests_per_second: float = typer.Option(
+        25,
+        "--snyk-requests-per-second",
+        help="Maximum sustained rate of Snyk API requests, used for the planning calls and the projected runtime. Default: 25",
+        min=0.1,
+        envvar="SNYK_REQUESTS_PER_SECOND"
+    ),
+    cache_file: CacheFileOption = None,
+    cache_ttl: CacheTtlOption = 3600,
+    batch_size: BatchSizeOption = "1000",
+    throughput_file: str = typer.Option(
+        "snyk-import-throughput.json",
+        "--throughput-file",
+        help="Path to the file with the import throughput measured by earlier runs, used for --batch-size=auto and the projected runtime. Default: snyk-import-throughput.json",
+        envvar="SNYK_IMPORT_THROUGHPUT_FILE"
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "--incremental",
+        help="Only count repos that are not already targets in the Snyk org or its <org>-N orgs. Default: False",
+        is_flag=True
+    )
+):
+    """
+    Work out what run-snyk-api-import would do without changing anything in Snyk: the matched orgs,
+    their targets, batches and <org>-N orgs to create, the API calls and the projected runtime.
+    """
+    check_snyk_api_tenant(snyk_api_tenant)
+    batch_size = check_batch_size(batch_size)
+    check_github_org_resolution(github_org_resolution)
+    throughput_tracker.load(throughput_file)
+    run_metrics.reset()
+    check_csv_file(csv_file_path)
+
+    from apis.snykAsyncApi import fetch_snyk_orgs
+    from utils.planner import describe_plan, estimate_run, plan_orgs, plan_totals, write_plan
+
+    parallel_imports = max_parallel_imports or max_parallel_orgs
+    process_runner.configure(parallel_imports)
+    snyk_rate_limiter.configure(snyk_requests_per_second)
+    api_cache.configure(cache_ttl, cache_file)
+
     try:
-        org_data_files_path = find_org_data_files()
+        with run_metrics.timer('snyk_orgs'):
+            group_org_index = GroupOrgIndex(fetch_snyk_orgs(group_id, snyk_api_tenant))
     except Exception as e:
-        print(f"Error in finding org data json files: {str(e)}")
+        print(f"Error in collecting Snyk orgs: {str(e)}")
         raise typer.Exit(1)
-    
-    # Import the json files
+
+    resolve_github_orgs = github_org_resolver(github_token, github_org_resolution)
+
+    # Import data from an earlier plan is replaced, so the plan's workspaces only hold its own orgs
+    plan_directory = f'{plan_file}.workspaces'
+    shutil.rmtree(plan_directory, ignore_errors=True)
+    run_directory = create_run_directory(plan_directory)
+    csv_mappings = list(iter_csv_mappings(csv_file_path))
+    matches = iter_matches(csv_mappings, resolve_github_orgs, group_org_index, None, snyk_api_concurrency)
+    job_workspaces = iter_job_workspaces(matches, run_directory, [], group_id, snyk_api_tenant, snyk_api_concurrency)
+    org_plans, failed_orgs = plan_orgs(job_workspaces, snyk_api_import_name, snyk_api_tenant, group_org_index, batch_size, incremental, use_github_cloud_app_integration, max_parallel_orgs)
+
+    import_plan = {
+        'csv_file': os.path.abspath(csv_file_path),
+        'csv_sha256': file_sha256(csv_file_path),
+        'group_id': group_id,
+        'snyk_api_tenant': snyk_api_tenant,
+        'batch_size': batch_size,
+        'incremental': incremental,
+        'use_github_cloud_app_integration': use_github_cloud_app_integration,
+        'totals': plan_totals(org_plans, failed_orgs, len(csv_mappings)),
+        **estimate_run(org_plans, len(group_org_index), snyk_requests_per_second, min(parallel_imports, max_parallel_orgs * max_parallel_batches), max_parallel_batches),
+        'failed_orgs': failed_orgs,
+        'orgs': org_plans,
+    }
     try:
-        import_repos(org_data_files_path, snyk_api_import_name, snyk_api_tenant, group_id, snyk_source_org_id, use_github_cloud_app_integration)
+        write_plan(import_plan, plan_file)
     except Exception as e:
-        print(f"Error in importing repos: {str(e)} \n Continuing with cleanup...")
-    
-    # Clean up the json and log files
+        print(f"Error in writing the plan: {str(e)}")
+        raise typer.Exit(1)
+    print(describe_plan(import_plan))
+    print(f"Plan written to {plan_file}")
+
+@app.command(name="merge")
+def merge(
+    shard_count: int = typer.Option(
+        None,
+        "--shard-count",
+        help="Number of shards to merge.  Their files are found under the shard names of --results-file and --failed-targets-file",
+        min=1,
+        envvar="SNYK_IMPORT_SHARD_COUNT"
+    ),
+    shard_results_files: List[str] = typer.Option(
+        [],
+        "--shard-results-file",
+        help="Results file of a shard, for example copied from another node.  Repeat for every shard.  Default: the shard names of --results-file"
+    ),
+    shard_failed_targets_files: List[str] = typer.Option(
+        [],
+        "--shard-failed-targets-file",
+        help="Failed targets file of a shard.  Repeat for every shard.  Default: the shard names of --failed-targets-file"
+    ),
+    results_file: str = typer.Option(
+        "snyk-import-results.json",
+        "--results-file",
+        help="Path of the merged summary of imported and failed targets. Default: snyk-import-results.json",
+        envvar="SNYK_IMPORT_RESULTS_FILE"
+    ),
+    failed_targets_file: str = typer.Option(
+        "snyk-import-failed-targets.json",
+        "--failed-targets-file",
+        help="Path of the merged import file of the targets that failed on any shard. Default: snyk-import-failed-targets.json",
+        envvar="SNYK_IMPORT_FAILED_TARGETS_FILE"
+    )
+):
+    """
+    Combine the results and failed targets of the shards of a sharded run-snyk-api-import.
+    """
+    if not shard_results_files:
+        if not shard_count:
+            typer.echo("Error: Pass --shard-count or a --shard-results-file for every shard")
+            raise typer.Exit(1)
+        shard_results_files = shard_paths(results_file, shard_count)
+        shard_failed_targets_files = shard_failed_targets_files or shard_paths(failed_targets_file, shard_count)
+    # Without a failed targets file for every shard the merged one would silently lose failures
+    if len(shard_failed_targets_files) != len(shard_results_files):
+        typer.echo(f"Error: Pass a --shard-failed-targets-file for every shard, got {len(shard_failed_targets_files)} for {len(shard_results_files)} results files")
+        raise typer.Exit(1)
+
+    missing_files = [path for path in shard_results_files + shard_failed_targets_files if not os.path.isfile(path)]
+    if missing_files:
+        typer.echo(f"Error: Missing shard files: {', '.join(missing_files)}")
+        raise typer.Exit(1)
+
     try:
-        clean_up(org_data_files_path, 'json')
-        log_files_path = find_log_files()
-        clean_up(log_files_path, 'log')
-        import_files_path = find_batch_import_data_files()
-        clean_up(import_files_path, 'import')
+        summary = merge_results(shard_results_files, results_file)
+        failed_target_count = merge_failed_targets(shard_failed_targets_files, failed_targets_file)
     except Exception as e:
-        print(f"Error in cleaning up json files: {str(e)}")
+        print(f"Error in merging shard results: {str(e)}")
         raise typer.Exit(1)
-        
+    print(f"Merged {len(shard_results_files)} shards: imported {summary['totals']['imported']} targets, {summary['totals']['failed']} failed.  Results written to {results_file}")
+    if failed_target_count:
+        print(f"Wrote {failed_target_count} failed targets to {failed_targets_file}")
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,157 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from helpers.helper import file_sha256
+
+DEFAULT_ARCHIVE_DIRECTORY = 'snyk-import-archive'
+DEFAULT_RETENTION_DAYS = 90
+OBJECTS_DIRECTORY = 'objects'
+ARCHIVE_SUFFIX = '.tar.gz'
+MANIFEST_SUFFIX = '.manifest.json'
+# Import files are large and often the same from one run to the next, so they are stored once per
+# content hash instead of in every run's archive
+DEDUPLICATED_KINDS = ('import',)
+
+def write_json_atomically(path: str, data: dict) -> None:
+    temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(temporary_path, path)
+
+class RunArchive:
+    """
+    Keeps the files of finished runs in one directory: a tar.gz per run with a manifest next to it, and
+    an object store of gzipped import files named by their sha256 that the manifests point to.  Runs
+    older than the retention are pruned together with the objects no remaining run uses, so disk use
+    and the number of directory entries stay bounded.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_DIRECTORY, retention_days: float | None = DEFAULT_RETENTION_DAYS):
+        self.path = os.path.abspath(path)
+        self.objects_path = os.path.join(self.path, OBJECTS_DIRECTORY)
+        self.retention_days = retention_days
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_path, sha256[:2], f'{sha256}.gz')
+
+    # Store a file in the object store.  Returns its sha256 and whether it was new.  A file that is
+    # already stored gets its mtime refreshed, so pruning sees it is still in use.
+    def store_object(self, file_path: str) -> tuple[str, bool]:
+        sha256 = file_sha256(file_path)
+        object_path = self.object_path(sha256)
+        if os.path.isfile(object_path):
+            os.utime(object_path)
+            return (sha256, False)
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temporary_path = f'{object_path}.{uuid.uuid4().hex}.tmp'
+        with open(file_path, 'rb') as source, gzip.open(temporary_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(temporary_path, object_path)
+        return (sha256, True)
+
+    # Archive the files of a run and remove them.  files_by_kind maps a kind (json, log or import) to its
+    # files, which are stored under <kind>/<path relative to base_directory>.  Returns the path of the
+    # run's archive, or None when there was nothing to archive.
+    def add_run(self, files_by_kind: Dict[str, List[str]], base_directory: str) -> str | None:
+        os.makedirs(self.path, exist_ok=True)
+        run_id = f'{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}'
+        archive_path = os.path.join(self.path, f'{run_id}{ARCHIVE_SUFFIX}')
+        temporary_path = f'{archive_path}.tmp'
+        entries = []
+        archived_files = []
+        deduplicated = 0
+
+        with tarfile.open(temporary_path, 'w:gz') as archive:
+            for kind, files in files_by_kind.items():
+                for file in files:
+                    if not os.path.isfile(file):
+                        print(f"File {file} does not exist")
+                        continue
+                    relative_path = os.path.relpath(file, base_directory)
+                    if relative_path.startswith('..'):
+                        relative_path = os.path.basename(file)
+                    entry = {'kind': kind, 'path': f'{kind}/{relative_path}', 'size': os.path.getsize(file)}
+                    if kind in DEDUPLICATED_KINDS:
+                        sha256, stored = self.store_object(file)
+                        entry.update(sha256=sha256, object=os.path.relpath(self.object_path(sha256), self.path))
+                        deduplicated += not stored
+                    else:
+                        archive.add(file, arcname=entry['path'])
+                    entries.append(entry)
+                    archived_files.append(file)
+
+            manifest = {
+                'run': run_id,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'archive': os.path.basename(archive_path),
+                'totals': {'files': len(entries), 'bytes': sum(entry['size'] for entry in entries), 'deduplicated': deduplicated},
+                'files': entries,
+            }
+            # The archive carries its own manifest, the copy next to it is what pruning reads
+            manifest_content = json.dumps(manifest, indent=4).encode()
+            manifest_info = tarfile.TarInfo('manifest.json')
+            manifest_info.size = len(manifest_content)
+            manifest_info.mtime = int(time.time())
+            archive.addfile(manifest_info, io.BytesIO(manifest_content))
+
+        if not entries:
+            os.remove(temporary_path)
+            return None
+        os.replace(temporary_path, archive_path)
+        write_json_atomically(os.path.join(self.path, f'{run_id}{MANIFEST_SUFFIX}'), manifest)
+
+        for file in archived_files:
+            os.remove(file)
+        print(f'Archived {len(entries)} files to {archive_path} ({deduplicated} import files already stored)')
+        return archive_path
+
+    # Remove the runs older than the retention and the objects that no remaining run refers to.  Objects
+    # are only removed once they are older than the retention too, so an object stored by a run that is
+    # still writing its manifest is left alone.  Returns the number of runs removed.
+    def prune(self) -> int:
+        if not self.retention_days or not os.path.isdir(self.path):
+            return 0
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        referenced_objects = set()
+        pruned_runs = 0
+        unreadable_manifests = False
+
+        for file_name in os.listdir(self.path):
+            if not file_name.endswith(MANIFEST_SUFFIX):
+                continue
+            manifest_path = os.path.join(self.path, file_name)
+            if os.path.getmtime(manifest_path) < cutoff:
+                archive_path = os.path.join(self.path, file_name[:-len(MANIFEST_SUFFIX)] + ARCHIVE_SUFFIX)
+                for path in (archive_path, manifest_path):
+                    if os.path.isfile(path):
+                        os.remove(path)
+                pruned_runs += 1
+                continue
+            try:
+                with open(manifest_path, 'r') as file:
+                    referenced_objects.update(entry['object'] for entry in json.load(file)['files'] if entry.get('object'))
+            except (OSError, ValueError, KeyError):
+                print(f'Ignoring unreadable archive manifest {manifest_path}')
+                unreadable_manifests = True
+
+        # Without every manifest it is unknown which objects are still used, so they are all kept
+        if not pruned_runs or unreadable_manifests:
+            return pruned_runs
+        pruned_objects = 0
+        for directory, _, file_names in os.walk(self.objects_path):
+            for file_name in file_names:
+                object_path = os.path.join(directory, file_name)
+                if os.path.relpath(object_path, self.path) not in referenced_objects and os.path.getmtime(object_path) < cutoff:
+                    os.remove(object_path)
+                    pruned_objects += 1
+        print(f'Pruned {pruned_runs} archived runs and {pruned_objects} stored import files older than {self.retention_days:g} days')
+        return pruned_runs
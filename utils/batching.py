@@ -0,0 +1,94 @@
+import json
+import math
+import os
+import threading
+
+from utils.importTargets import iter_import_targets
+
+DEFAULT_BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 250
+MAX_BATCH_SIZE = 5000
+# How long a single batch import should take when the batch size is picked automatically
+DEFAULT_BATCH_SECONDS = 30 * 60
+AUTO_BATCH_SIZE = 'auto'
+
+class ThroughputTracker:
+    """
+    Keeps an exponentially weighted average of snyk-api-import throughput (targets imported per second),
+    saved to a JSON file so the automatic batch size can use what earlier runs measured.
+    """
+
+    def __init__(self, path: str | None = None, smoothing: float = 0.3):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.path = None
+        self.targets_per_second = None
+        self.samples = 0
+        self.load(path)
+
+    def load(self, path: str | None) -> None:
+        with self._lock:
+            self.path = path
+            if path and os.path.isfile(path):
+                try:
+                    with open(path, 'r') as file:
+                        data = json.load(file)
+                    self.targets_per_second = data.get('targets_per_second')
+                    self.samples = data.get('samples', 0)
+                except (OSError, json.JSONDecodeError):
+                    print(f'Ignoring unreadable throughput file {path}')
+
+    def record(self, target_count: int, seconds: float) -> None:
+        if target_count <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            rate = target_count / seconds
+            if self.targets_per_second is None:
+                self.targets_per_second = rate
+            else:
+                self.targets_per_second = self.smoothing * rate + (1 - self.smoothing) * self.targets_per_second
+            self.samples += 1
+            if self.path:
+                with open(self.path, 'w') as file:
+                    json.dump({'targets_per_second': self.targets_per_second, 'samples': self.samples}, file)
+
+# Pick a batch size for an org with target_count targets.  With a measured throughput the batch is as big
+# as can be imported in about batch_seconds, otherwise the default size is used.  Batches are then evened
+# out so an org just over the limit becomes two half-size batches instead of a full one and a sliver.
+def choose_batch_size(target_count: int, targets_per_second: float | None = None, batch_seconds: float = DEFAULT_BATCH_SECONDS, min_batch_size: int = MIN_BATCH_SIZE, max_batch_size: int = MAX_BATCH_SIZE) -> int:
+    if targets_per_second:
+        batch_size = int(targets_per_second * batch_seconds)
+    else:
+        batch_size = DEFAULT_BATCH_SIZE
+    batch_size = max(min_batch_size, min(max_batch_size, batch_size))
+
+    if target_count <= batch_size:
+        return max(batch_size, 1)
+    batch_count = math.ceil(target_count / batch_size)
+    return math.ceil(target_count / batch_count)
+
+def count_import_targets(file_path: str, target_filter=None) -> int:
+    return sum(1 for target in iter_import_targets(file_path) if target_filter is None or target_filter(target))
+
+# Resolve the --batch-size setting for one import file, counting only the targets target_filter keeps
+# unless the count is already known
+def resolve_batch_size(batch_size, import_file_path: str, target_filter=None, target_count: int | None = None) -> int:
+    if batch_size != AUTO_BATCH_SIZE:
+        return int(batch_size)
+    if target_count is None:
+        target_count = count_import_targets(import_file_path, target_filter)
+    chosen = choose_batch_size(target_count, throughput_tracker.targets_per_second)
+    print(f'Picked batch size {chosen} for {target_count} targets')
+    return chosen
+
+# Validate a --batch-size value: a positive number of targets or "auto"
+def parse_batch_size(value: str) -> str | int:
+    if str(value).lower() == AUTO_BATCH_SIZE:
+        return AUTO_BATCH_SIZE
+    batch_size = int(value)
+    if batch_size < 1:
+        raise ValueError('Batch size must be at least 1')
+    return batch_size
+
+# Shared throughput measurements
+throughput_tracker = ThroughputTracker()
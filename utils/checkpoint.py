@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+GENERATED = 'generated'
+SPLIT = 'split'
+ORG_CREATED = 'org-created'
+IMPORTED = 'imported'
+
+ORG_UNIT = 'org'
+
+def batch_unit(batch_number: int) -> str:
+    return f'batch-{batch_number}'
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of what has been done for each org and batch (generated, split,
+    org-created, imported).  Every record is flushed to disk as soon as it is written, so a run that
+    dies partway through can be resumed and skip the units that already finished.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+
+        if resume and os.path.isfile(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run killed mid-write can leave a partial last line
+                        continue
+                    self._records[(record['org'], record['unit'], record['state'])] = record
+            print(f'Resuming from checkpoint journal {path} with {len(self._records)} completed steps')
+
+        self._file = open(path, 'a' if resume else 'w')
+
+    def record(self, org: str, state: str, unit: str = ORG_UNIT, **details) -> None:
+        record = {'time': datetime.now(timezone.utc).isoformat(), 'org': org, 'unit': unit, 'state': state, **details}
+        with self._lock:
+            self._records[(org, unit, state)] = record
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def has(self, org: str, state: str, unit: str = ORG_UNIT) -> bool:
+        with self._lock:
+            return (org, unit, state) in self._records
+
+    def details(self, org: str, state: str, unit: str = ORG_UNIT) -> dict | None:
+        with self._lock:
+            return self._records.get((org, unit, state))
+
+    # Drop every record of an org, for example when it is going to be imported into another Snyk org.
+    # The journal is rewritten without them, so a resumed run does not pick them up again.
+    def forget(self, org: str) -> None:
+        with self._lock:
+            self._records = {key: record for key, record in self._records.items() if key[0] != org}
+            self._file.close()
+            temporary_path = f'{self.path}.tmp'
+            with open(temporary_path, 'w') as file:
+                for record in self._records.values():
+                    file.write(json.dumps(record) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self.path)
+            self._file = open(self.path, 'a')
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,72 @@
+import csv
+from typing import Dict, Iterable, Iterator
+
+import typer
+
+CSV_GITHUB_ORG_COLUMN = 'GitHub-Org-Name'
+CSV_SNYK_ORG_COLUMN = 'Snyk-Org-Name'
+
+# Check the CSV file can be read and has the required columns before any rows are processed
+def check_csv_file(csv_file_path: str) -> None:
+    try:
+        with open(csv_file_path, mode='r', newline='') as file:
+            fieldnames = csv.DictReader(file).fieldnames or []
+    except FileNotFoundError:
+        typer.echo(f"Error: Could not find CSV file at {csv_file_path}")
+        raise typer.Exit(code=1)
+    except Exception as e:
+        typer.echo(f"Error reading CSV file: {str(e)}")
+        raise typer.Exit(code=1)
+
+    missing_columns = {CSV_GITHUB_ORG_COLUMN, CSV_SNYK_ORG_COLUMN} - set(fieldnames)
+    if missing_columns:
+        typer.echo(f"Error: CSV file is missing the column(s): {', '.join(sorted(missing_columns))}")
+        raise typer.Exit(code=1)
+
+def iter_csv_mappings(csv_file_path: str) -> Iterator[Dict[str, str]]:
+    """
+    Stream the CSV file and yield one {'github_org_name', 'snyk_org_name', 'line_number'} mapping per
+    valid row as it is read.  Rows with missing values and repeated GitHub orgs are reported with their
+    line number and skipped, so every GitHub org is imported once.
+    """
+    seen_github_orgs = {}
+    skipped_rows = 0
+    try:
+        with open(csv_file_path, mode='r', newline='') as file:
+            csv_reader = csv.DictReader(file)
+            for row in csv_reader:
+                line_number = csv_reader.line_num
+                github_org_name = (row.get(CSV_GITHUB_ORG_COLUMN) or '').strip()
+                snyk_org_name = (row.get(CSV_SNYK_ORG_COLUMN) or '').strip()
+
+                if not github_org_name or not snyk_org_name:
+                    print(f"Skipping CSV line {line_number}: {CSV_GITHUB_ORG_COLUMN} and {CSV_SNYK_ORG_COLUMN} are both required")
+                    skipped_rows += 1
+                    continue
+                if github_org_name in seen_github_orgs:
+                    first_line, first_snyk_org_name = seen_github_orgs[github_org_name]
+                    if first_snyk_org_name != snyk_org_name:
+                        print(f"Skipping CSV line {line_number}: {github_org_name} is already mapped to {first_snyk_org_name} on line {first_line}")
+                    else:
+                        print(f"Skipping CSV line {line_number}: duplicate of line {first_line}")
+                    skipped_rows += 1
+                    continue
+
+                seen_github_orgs[github_org_name] = (line_number, snyk_org_name)
+                yield {'github_org_name': github_org_name, 'snyk_org_name': snyk_org_name, 'line_number': line_number}
+    except csv.Error as e:
+        typer.echo(f"Error reading CSV file: {str(e)}")
+        raise typer.Exit(code=1)
+
+    typer.echo(f"Successfully read CSV file with {len(seen_github_orgs)} entries ({skipped_rows} rows skipped)")
+
+# Group the items of an iterable into lists of up to size items
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
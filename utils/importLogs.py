@@ -0,0 +1,166 @@
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from utils.importTargets import BatchFileWriter, iter_import_targets
+from utils.workspace import JobWorkspace
+
+# Log files snyk-api-import writes into SNYK_LOG_PATH, named <orgId>.<suffix>
+IMPORTED_TARGETS_LOG_SUFFIX = 'imported-targets.log'
+FAILED_IMPORTS_LOG_SUFFIX = 'failed-imports.log'
+
+# Stream the JSON records of a snyk-api-import log one line at a time
+def iter_log_records(log_file: str) -> Iterator[dict]:
+    with open(log_file, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                yield record
+
+def target_key(target: dict) -> tuple:
+    return (target.get('owner'), target.get('name'), target.get('branch'))
+
+class ImportResults:
+    """
+    Per-target results of a run, indexed by GitHub org and by the Snyk org each batch was imported into.
+    A target that failed and later succeeded (for example on a retry pass) counts as imported.  The logs
+    of a retry pass are counted under the GitHub org whose import of the target failed.
+    """
+
+    def __init__(self):
+        # (GitHub org, Snyk org ID) -> set of target keys
+        self.imported = {}
+        # (GitHub org, Snyk org ID) -> {target key: failed target}
+        self.failed = {}
+        # (Snyk org ID, target key) -> GitHub org of every failed target, to place retried targets
+        self.failed_github_orgs = {}
+
+    def ingest_workspace(self, workspace: JobWorkspace, retry: bool = False) -> None:
+        for log_file in workspace.log_files():
+            file_name = os.path.basename(log_file)
+            imported = file_name.endswith(IMPORTED_TARGETS_LOG_SUFFIX)
+            if not imported and not file_name.endswith(FAILED_IMPORTS_LOG_SUFFIX):
+                continue
+
+            file_org_id = file_name.split('.', 1)[0]
+            for record in iter_log_records(log_file):
+                target = record.get('target')
+                if not isinstance(target, dict):
+                    continue
+                org_id = record.get('orgId') or file_org_id
+                github_org_name = workspace.github_org_name
+                if retry:
+                    github_org_name = self.failed_github_orgs.get((org_id, target_key(target)), github_org_name)
+                key = (github_org_name, org_id)
+                # Only the identity of imported targets is kept; failures keep what a retry needs
+                if imported:
+                    self.imported.setdefault(key, set()).add(target_key(target))
+                    continue
+                self.failed_github_orgs[(org_id, target_key(target))] = github_org_name
+                self.failed.setdefault(key, {})[target_key(target)] = {
+                    'orgId': org_id,
+                    'integrationId': record.get('integrationId'),
+                    'target': target,
+                    'error': record.get('errorMessage') or record.get('message') or record.get('msg'),
+                }
+
+    # Failed targets that did not succeed later, keyed by (GitHub org, Snyk org ID).  A success in any
+    # workspace for the same Snyk org counts, so a retry pass clears the original failures.
+    def failed_by_org(self) -> dict:
+        imported_by_org_id = {}
+        for (_, org_id), targets in self.imported.items():
+            imported_by_org_id.setdefault(org_id, set()).update(targets)
+
+        failed = {}
+        for key, targets in self.failed.items():
+            imported = imported_by_org_id.get(key[1], set())
+            failed[key] = [result for target_id, result in targets.items() if target_id not in imported]
+        return failed
+
+    def failed_targets(self) -> Iterator[dict]:
+        for results in self.failed_by_org().values():
+            yield from results
+
+    def summary(self) -> dict:
+        orgs = {}
+        totals = Counter()
+        failed_by_org = self.failed_by_org()
+
+        for (github_org_name, org_id) in sorted(set(self.imported) | set(self.failed)):
+            failures = failed_by_org.get((github_org_name, org_id), [])
+            imported_count = len(self.imported.get((github_org_name, org_id), {}))
+            orgs.setdefault(github_org_name, {})[org_id] = {
+                'imported': imported_count,
+                'failed': len(failures),
+                'errors': dict(Counter(result['error'] or 'Unknown error' for result in failures)),
+            }
+            totals['imported'] += imported_count
+            totals['failed'] += len(failures)
+
+        return {
+            'generated': datetime.now(timezone.utc).isoformat(),
+            'totals': {'imported': totals['imported'], 'failed': totals['failed']},
+            'orgs': orgs,
+        }
+
+# Add the orgs of an earlier results file that are not in summary, for a resumed run whose finished orgs
+# were archived with their logs.  Returns the Snyk org IDs whose failed targets are carried over.
+def keep_previous_results(summary: dict, results_file: str) -> set:
+    try:
+        with open(results_file, 'r') as file:
+            previous_orgs = json.load(file).get('orgs', {})
+    except (OSError, ValueError):
+        return set()
+
+    current_org_ids = {org_id for org_results in summary['orgs'].values() for org_id in org_results}
+    carried_org_ids = set()
+    for github_org_name, org_results in previous_orgs.items():
+        if github_org_name in summary['orgs']:
+            continue
+        summary['orgs'][github_org_name] = org_results
+        carried_org_ids.update(org_id for org_id, result in org_results.items() if result.get('failed') and org_id not in current_org_ids)
+
+    org_results = [result for results_by_org in summary['orgs'].values() for result in results_by_org.values()]
+    summary['totals'] = {'imported': sum(result['imported'] for result in org_results), 'failed': sum(result['failed'] for result in org_results)}
+    summary['orgs'] = {github_org_name: summary['orgs'][github_org_name] for github_org_name in sorted(summary['orgs'])}
+    return carried_org_ids
+
+# Read the snyk-api-import logs of every workspace, write the summary and a failed-targets-only import
+# file.  With keep_previous the orgs of the existing files that this run did not import again are kept,
+# so a resumed run reports every org.  The retry_workspaces of a retry pass are read last and their
+# targets counted under their GitHub orgs.  Returns the number of failed targets written to the import file.
+def ingest_import_logs(workspaces: Iterable[JobWorkspace], results_file: str, failed_targets_file: str, keep_previous: bool = False, retry_workspaces: Iterable[JobWorkspace] = ()) -> int:
+    results = ImportResults()
+    for workspace in workspaces:
+        results.ingest_workspace(workspace)
+    for workspace in retry_workspaces:
+        results.ingest_workspace(workspace, retry=True)
+
+    summary = results.summary()
+    carried_org_ids = keep_previous_results(summary, results_file) if keep_previous else set()
+    with open(results_file, 'w') as file:
+        json.dump(summary, file, indent=4)
+
+    # Written next to the old file first, which still holds the carried over failures
+    writer = BatchFileWriter(f'{failed_targets_file}.tmp')
+    for result in results.failed_targets():
+        writer.write({'orgId': result['orgId'], 'integrationId': result['integrationId'], 'target': result['target']})
+    if carried_org_ids and os.path.isfile(failed_targets_file):
+        for import_target in iter_import_targets(failed_targets_file):
+            if import_target.get('orgId') in carried_org_ids:
+                writer.write(import_target)
+    writer.close()
+    os.replace(f'{failed_targets_file}.tmp', failed_targets_file)
+
+    print(f"Imported {summary['totals']['imported']} targets, {summary['totals']['failed']} failed.  Results written to {results_file}")
+    if writer.count:
+        print(f'Wrote {writer.count} failed targets to {failed_targets_file}')
+    return writer.count
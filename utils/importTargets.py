@@ -0,0 +1,141 @@
+import json
+import os
+import re
+from typing import Iterator, List
+
+CHUNK_SIZE = 1 << 16
+TARGETS_ARRAY_START = re.compile(r'"targets"\s*:\s*\[')
+WHITESPACE_AND_COMMAS = re.compile(r'[\s,]*')
+
+# Yield the items of the top level "targets" array of an import file one at a time, reading the file
+# in chunks so memory use does not grow with the number of targets.
+def iter_import_targets(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as file:
+        buffer = ''
+        eof = False
+
+        # Find the start of the targets array
+        while True:
+            match = TARGETS_ARRAY_START.search(buffer)
+            if match:
+                position = match.end()
+                break
+            if eof:
+                raise ValueError(f"No 'targets' array found in {file_path}")
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            # Keep the tail in case the key is split across chunks
+            buffer = buffer[-32:] + chunk
+
+        while True:
+            position = WHITESPACE_AND_COMMAS.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            try:
+                target, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"Truncated 'targets' array in {file_path}")
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+
+            yield target
+
+            # Drop what has been parsed so the buffer stays around one chunk in size
+            if position > chunk_size:
+                buffer = buffer[position:]
+                position = 0
+
+class BatchFileWriter:
+    """Writes a compact {"targets": [...]} import file one target at a time."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.count = 0
+        self._file = open(file_path, 'w')
+        self._file.write('{"targets":[')
+
+    def write(self, target: dict) -> None:
+        if self.count:
+            self._file.write(',')
+        self._file.write(json.dumps(target, separators=(',', ':')))
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.write(']}')
+        self._file.close()
+
+# Split an import file into batch files in a single streaming pass.  batch_ids(batch_number, first_target)
+# returns the final orgId/integrationId for a batch (or None to keep the targets as they are) and is
+# called when the batch is started, so every batch file is written once, already complete.
+#
+# Targets target_filter returns False for are left out.  The first batch is held in memory until it
+# overflows, so an org that fits in one batch and needs no changes never gets a copy of its import file.
+# Returns the batch file paths, or an empty list when the original file can be imported as it is, and
+# the first target kept (None when there is nothing to import).
+def stream_split_import_targets(file_path: str, batch_size: int, batch_file_path, batch_ids=None, target_filter=None) -> tuple[List[str], dict | None]:
+    first_batch = []
+    first_target = None
+    filtered = False
+    writer = None
+    overrides = None
+    batched_files = []
+
+    def start_batch(batch_overrides=None):
+        nonlocal writer, overrides
+        if writer is not None:
+            writer.close()
+        batch_number = len(batched_files) + 1
+        if batch_overrides is None and batch_ids:
+            batch_overrides = batch_ids(batch_number, first_target)
+        overrides = batch_overrides
+        writer = BatchFileWriter(batch_file_path(batch_number))
+        batched_files.append(writer.file_path)
+
+    def write(target):
+        writer.write({**target, **overrides} if overrides else target)
+
+    try:
+        for target in iter_import_targets(file_path):
+            if target_filter is not None and not target_filter(target):
+                filtered = True
+                continue
+            if first_target is None:
+                first_target = target
+
+            if writer is None:
+                if len(first_batch) < batch_size:
+                    first_batch.append(target)
+                    continue
+                # First batch is full, so the file has to be split
+                start_batch()
+                for buffered_target in first_batch:
+                    write(buffered_target)
+                first_batch = []
+
+            if writer.count == batch_size:
+                start_batch()
+            write(target)
+
+        # Everything fit in one batch.  Only write it out when targets were left out or have to change.
+        if writer is None and first_target is not None and (batch_ids or filtered):
+            first_batch_ids = batch_ids(1, first_target) if batch_ids else None
+            if filtered or (first_batch_ids and any(first_target.get(key) != value for key, value in first_batch_ids.items())):
+                start_batch(first_batch_ids or {})
+                for buffered_target in first_batch:
+                    write(buffered_target)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        for batch_file in batched_files:
+            os.remove(batch_file)
+        raise
+
+    if writer is not None:
+        writer.close()
+    return (batched_files, first_target)
@@ -0,0 +1,80 @@
+from typing import Iterable
+from urllib.parse import urlparse
+
+from apis.snykApi import get_snyk_org_data, get_snyk_targets, invalidate_snyk_targets
+from utils.orgIndex import GroupOrgIndex
+
+# Targets are matched on owner/name, case-insensitively like GitHub.  The Snyk targets API does not
+# return the branch, and import:data always generates the repo's default branch, which is the branch
+# Snyk monitors for a repo imported this way.
+def repo_key(owner: str | None, name: str | None) -> tuple | None:
+    if not owner or not name:
+        return None
+    return (owner.lower(), name.lower())
+
+# Key of an existing Snyk target from the REST targets API, read from "owner/name" in its display name
+# and falling back to its URL
+def snyk_target_key(target: dict) -> tuple | None:
+    attributes = target.get('attributes') or {}
+    display_name = attributes.get('display_name') or ''
+    if display_name.count('/') != 1 and attributes.get('url'):
+        display_name = urlparse(attributes['url']).path.strip('/')
+    owner, _, name = display_name.partition('/')
+    return repo_key(owner, name.split(':', 1)[0])
+
+# Key of a target in an import file ({"target": {"owner", "name", "branch"}, "orgId", "integrationId"})
+def import_target_key(import_target: dict) -> tuple | None:
+    target = import_target.get('target') or {}
+    return repo_key(target.get('owner'), target.get('name'))
+
+# The org the targets were generated for and the <org>-N orgs earlier split batches went into
+def related_org_ids(org_id: str, snyk_api_tenant: str, group_org_index: GroupOrgIndex) -> list[str]:
+    org_ids = [org_id]
+    org_data = get_snyk_org_data(org_id, snyk_api_tenant)
+    org_name = org_data['attributes']['name'] if isinstance(org_data, dict) else None
+    batch_number = 2
+    while org_name:
+        batch_org_id = group_org_index.find_id_by_name(f'{org_name}-{batch_number}')
+        if batch_org_id is None:
+            break
+        org_ids.append(batch_org_id)
+        batch_number += 1
+    return org_ids
+
+def existing_target_keys(org_ids: Iterable[str], snyk_api_tenant: str) -> set:
+    keys = set()
+    for org_id in org_ids:
+        for target in get_snyk_targets(org_id, snyk_api_tenant):
+            key = snyk_target_key(target)
+            if key:
+                keys.add(key)
+    return keys
+
+class IncrementalFilter:
+    """
+    Keeps only the import targets that are not already in Snyk.  The targets of every related org are
+    fetched once, and the counts tell how much of the generated import data was new.
+    """
+
+    def __init__(self, org_ids: Iterable[str], snyk_api_tenant: str):
+        self.org_ids = list(org_ids)
+        self.snyk_api_tenant = snyk_api_tenant
+        self.existing = existing_target_keys(self.org_ids, snyk_api_tenant)
+        self.new = set()
+        self.skipped = set()
+
+    def __call__(self, import_target: dict) -> bool:
+        key = import_target_key(import_target)
+        if key is not None and key in self.existing:
+            self.skipped.add(key)
+            return False
+        self.new.add(key)
+        return True
+
+    # The imported targets make the cached target lists out of date
+    def invalidate(self) -> None:
+        for org_id in self.org_ids:
+            invalidate_snyk_targets(org_id, self.snyk_api_tenant)
+
+    def describe(self) -> str:
+        return f'{len(self.new)} new targets, {len(self.skipped)} already in Snyk'
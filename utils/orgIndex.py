@@ -0,0 +1,46 @@
+import threading
+from typing import Iterable
+
+class GroupOrgIndex:
+    """
+    The Snyk orgs of a group keyed by name and by slug, built once per run.  Orgs created during the run
+    are added in place, so later lookups find them without listing the group again.  Safe to share
+    between import workers.
+    """
+
+    def __init__(self, orgs: Iterable[dict] = ()):
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._by_slug = {}
+        for org in orgs:
+            self.add(org)
+
+    # Add an org in the REST API shape ({'id': ..., 'attributes': {'name': ..., 'slug': ...}})
+    def add(self, org: dict) -> None:
+        attributes = org.get('attributes', {})
+        with self._lock:
+            if attributes.get('slug'):
+                self._by_slug[attributes['slug']] = org
+            if attributes.get('name'):
+                self._by_name[attributes['name']] = org
+
+    # Add an org returned by the v1 create org endpoint
+    def add_created_org(self, created_org: dict) -> None:
+        self.add({'id': created_org['id'], 'type': 'org', 'attributes': {'name': created_org.get('name'), 'slug': created_org.get('slug')}})
+
+    # Look an org up by name, falling back to slug
+    def get(self, name_or_slug: str) -> dict | None:
+        with self._lock:
+            return self._by_name.get(name_or_slug) or self._by_slug.get(name_or_slug)
+
+    def find_id_by_name(self, name: str) -> str | None:
+        with self._lock:
+            org = self._by_name.get(name)
+        return org['id'] if org else None
+
+    def __contains__(self, name_or_slug: str) -> bool:
+        return self.get(name_or_slug) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len({org['id'] for org in list(self._by_name.values()) + list(self._by_slug.values())})
@@ -0,0 +1,156 @@
+import json
+import math
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+from apis.snykApi import get_snyk_org_data
+from helpers.metrics import run_metrics
+from utils.batching import count_import_targets, resolve_batch_size, throughput_tracker
+from utils.checkpoint import CheckpointJournal, GENERATED
+from utils.incremental import IncrementalFilter, related_org_ids
+from utils.orgIndex import GroupOrgIndex
+from utils.provisioning import batch_count
+from utils.utils import generate_import_data, read_json_file
+from utils.workspace import JobWorkspace
+
+PLAN_VERSION = 1
+# Items per page of the Snyk REST listings
+REST_PAGE_SIZE = 100
+
+def rest_pages(item_count: int) -> int:
+    return max(1, math.ceil(item_count / REST_PAGE_SIZE))
+
+# Generate one org's import data and work out its batches and <org>-N orgs.  Only reads from Snyk: the
+# org's existing targets with --incremental and its name when it needs batch orgs.  Returns the org's
+# entry in the plan, or None when import:data failed.
+def plan_org(workspace: JobWorkspace, snyk_api_import_name, snyk_api_tenant, group_org_index: GroupOrgIndex, batch_size, incremental: bool, github_cloud_app_integration: bool) -> dict | None:
+    org_name = workspace.github_org_name
+    result = generate_import_data(workspace, snyk_api_import_name, snyk_api_tenant)
+    if not result.succeeded:
+        print(f'snyk-api-import import:data {result.describe()} for {org_name}')
+        return None
+
+    org_id = read_json_file(workspace.org_data_file)['orgData'][0]['orgId']
+    org_plan = {'github_org_name': org_name, 'snyk_org_id': org_id, 'workspace': workspace.path, 'import_targets_file': None, 'targets': 0, 'batch_size': None, 'batches': 0, 'batch_orgs': [], 'api_calls': {'org_integrations': 1}}
+    if not workspace.has_import_targets_file():
+        print(f'No import file found for {org_name}')
+        return org_plan
+
+    target_filter = None
+    if incremental:
+        with run_metrics.timer('existing_targets', org_name):
+            target_filter = IncrementalFilter(related_org_ids(org_id, snyk_api_tenant, group_org_index), snyk_api_tenant)
+        # The org lookup, then a page of targets per related org
+        org_plan['api_calls']['existing_targets'] = 1 + len(target_filter.org_ids) + len(target_filter.existing) // REST_PAGE_SIZE
+
+    target_count = count_import_targets(workspace.import_targets_file, target_filter)
+    org_batch_size = resolve_batch_size(batch_size, workspace.import_targets_file, target_filter, target_count)
+    batches = batch_count(target_count, org_batch_size)
+    org_plan.update(import_targets_file=workspace.import_targets_file, targets=target_count, batch_size=org_batch_size, batches=batches)
+    if target_filter is not None:
+        org_plan['existing_targets'] = len(target_filter.skipped)
+
+    if batches > 1:
+        base_name = get_snyk_org_data(org_id, snyk_api_tenant)['attributes']['name']
+        for batch_number in range(2, batches + 1):
+            batch_org_name = f'{base_name}-{batch_number}'
+            org_plan['batch_orgs'].append({'batch': batch_number, 'name': batch_org_name, 'exists': group_org_index.find_id_by_name(batch_org_name) is not None})
+        new_orgs = sum(1 for batch_org in org_plan['batch_orgs'] if not batch_org['exists'])
+        # The base org lookup, one create per new org and at least one integrations check per batch org
+        org_plan['api_calls']['org_provisioning'] = 1 + new_orgs + batches - 1
+    if github_cloud_app_integration and target_count:
+        org_plan['api_calls']['cloud_app_integration'] = 1
+    return org_plan
+
+# Plan every job workspace, max_parallel_orgs at a time.  Returns the org plans and the names of the
+# orgs whose import data could not be generated.
+def plan_orgs(workspaces: Iterable[JobWorkspace], snyk_api_import_name, snyk_api_tenant, group_org_index: GroupOrgIndex, batch_size, incremental: bool, github_cloud_app_integration: bool, max_parallel_orgs: int = 1) -> tuple[List[dict], List[str]]:
+    org_plans = []
+    failed_orgs = []
+
+    def plan(workspace):
+        try:
+            return workspace, plan_org(workspace, snyk_api_import_name, snyk_api_tenant, group_org_index, batch_size, incremental, github_cloud_app_integration)
+        except Exception as e:
+            print(f'Planning failed for {workspace.github_org_name}: {str(e)}')
+            return workspace, None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_orgs)) as executor:
+        for workspace, org_plan in executor.map(plan, workspaces):
+            if org_plan is None:
+                failed_orgs.append(workspace.github_org_name)
+            else:
+                org_plans.append(org_plan)
+    return org_plans, failed_orgs
+
+# Estimate the API calls and the runtime of importing the planned orgs.  Snyk API time follows from the
+# request rate limit and import time from the throughput recorded by earlier runs: the targets spread
+# over the parallel imports, but never faster than the largest org's batches allow.
+def estimate_run(org_plans: List[dict], group_org_count: int, snyk_requests_per_second: float, parallel_imports: int, max_parallel_batches: int) -> dict:
+    api_calls = {'snyk_orgs': rest_pages(group_org_count)}
+    for org_plan in org_plans:
+        for name, count in org_plan['api_calls'].items():
+            api_calls[name] = api_calls.get(name, 0) + count
+    snyk_api_calls = sum(api_calls.values())
+    targets = sum(org_plan['targets'] for org_plan in org_plans)
+
+    targets_per_second = throughput_tracker.targets_per_second
+    import_seconds = None
+    if targets_per_second:
+        spread_seconds = targets / targets_per_second / max(1, parallel_imports)
+        longest_org_seconds = max((org_plan['targets'] / targets_per_second / max(1, min(max_parallel_batches, org_plan['batches'])) for org_plan in org_plans if org_plan['batches']), default=0)
+        import_seconds = max(spread_seconds, longest_org_seconds)
+    snyk_api_seconds = snyk_api_calls / snyk_requests_per_second
+
+    return {
+        'api_calls': {**api_calls, 'snyk_api_total': snyk_api_calls, 'snyk_api_import_requests': targets},
+        'throughput': {'targets_per_second': targets_per_second, 'samples': throughput_tracker.samples},
+        'projected_seconds': {
+            'snyk_api': snyk_api_seconds,
+            'import': import_seconds,
+            'total': snyk_api_seconds + import_seconds if import_seconds is not None else None,
+        },
+    }
+
+def plan_totals(org_plans: List[dict], failed_orgs: List[str], csv_rows: int) -> dict:
+    return {
+        'csv_rows': csv_rows,
+        'matched_orgs': len(org_plans) + len(failed_orgs),
+        'failed_orgs': len(failed_orgs),
+        'targets': sum(org_plan['targets'] for org_plan in org_plans),
+        'batches': sum(org_plan['batches'] for org_plan in org_plans),
+        'orgs_to_create': sum(1 for org_plan in org_plans for batch_org in org_plan['batch_orgs'] if not batch_org['exists']),
+    }
+
+def write_plan(plan: dict, path: str) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump({'version': PLAN_VERSION, 'created': datetime.now(timezone.utc).isoformat(), **plan}, file, indent=4)
+    os.replace(temporary_path, path)
+
+def read_plan(path: str) -> dict:
+    with open(path, 'r') as file:
+        plan = json.load(file)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f'Unsupported plan version {plan.get("version")}')
+    return plan
+
+def describe_plan(plan: dict) -> str:
+    totals = plan['totals']
+    projected = plan['projected_seconds']
+    runtime = f"{projected['total'] / 60:.1f} minutes" if projected['total'] is not None else 'unknown until an import has recorded throughput'
+    return (f"Plan: {totals['matched_orgs']} of {totals['csv_rows']} CSV rows matched, {totals['targets']} targets in {totals['batches']} batches, "
+            f"{totals['orgs_to_create']} <org>-N orgs to create, about {plan['api_calls']['snyk_api_total']} Snyk API calls.  Projected runtime: {runtime}")
+
+# Hand an org's planned import data to the run's job workspace, so the import starts from the split
+# instead of running import:data again
+def apply_planned_org(workspace: JobWorkspace, org_plan: dict, journal: CheckpointJournal) -> JobWorkspace:
+    workspace.batch_size = org_plan['batch_size']
+    if journal.details(workspace.github_org_name, GENERATED) is None and os.path.isfile(org_plan['import_targets_file']):
+        shutil.move(org_plan['import_targets_file'], workspace.import_targets_file)
+        journal.record(workspace.github_org_name, GENERATED, import_targets_file=workspace.import_targets_file)
+        shutil.rmtree(org_plan['workspace'], ignore_errors=True)
+    return workspace
@@ -0,0 +1,138 @@
+import json
+import os
+import signal
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from helpers.metrics import run_metrics
+
+# Exit codes that mean the command could not be run at all, so retrying won't help
+NOT_RETRYABLE_EXIT_CODES = (126, 127)
+
+class ProcessKilledError(RuntimeError):
+    """
+    A process was killed by a signal it was not sent by the runner, for example a Ctrl-C or the OOM killer
+    """
+
+    def __init__(self, result: 'ProcessResult'):
+        super().__init__(f'{os.path.basename(result.args[0])} {result.describe()}')
+        self.result = result
+
+class ProcessResult:
+    def __init__(self, args: List[str], returncode: int, duration: float, timed_out: bool, attempts: int = 1):
+        self.args = args
+        self.returncode = returncode
+        self.duration = duration
+        self.timed_out = timed_out
+        self.attempts = attempts
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    # Killed by a signal the runner did not send on a timeout
+    @property
+    def killed(self) -> bool:
+        return self.returncode < 0 and not self.timed_out
+
+    def describe(self) -> str:
+        if self.timed_out:
+            return f'timed out after {self.duration:.0f} seconds'
+        if self.killed:
+            try:
+                signal_name = signal.Signals(-self.returncode).name
+            except ValueError:
+                signal_name = str(-self.returncode)
+            return f'was killed by signal {signal_name} after {self.duration:.0f} seconds'
+        return f'exited with code {self.returncode} after {self.duration:.0f} seconds'
+
+# A process killed by a signal is not retried: it was stopped on purpose or by the system
+def is_retryable(result: ProcessResult) -> bool:
+    return result.timed_out or (not result.succeeded and not result.killed and result.returncode not in NOT_RETRYABLE_EXIT_CODES)
+
+class ProcessRunner:
+    """
+    Runs external commands from an argument list and an env dict, without a shell.  stdout and stderr
+    are streamed line by line to the console and to a JSON lines log, every process gets a timeout and a
+    semaphore caps how many run at the same time.  Failed runs can be retried based on the exit status.
+    """
+
+    def __init__(self, max_concurrent: int = 1, timeout: float | None = None, retries: int = 0, retry_delay: float = 30):
+        self.configure(max_concurrent, timeout, retries, retry_delay)
+
+    def configure(self, max_concurrent: int = 1, timeout: float | None = None, retries: int = 0, retry_delay: float = 30) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+
+    def run(self, args: List[str], env: Dict[str, str] | None = None, cwd: str | None = None, log_file: str | None = None, name: str = '', timeout: float | None = None) -> ProcessResult:
+        timeout = self.timeout if timeout is None else timeout
+        process_env = {**os.environ, **(env or {})}
+        log_lock = threading.Lock()
+        log = open(log_file, 'a') if log_file else None
+
+        def stream(pipe, stream_name):
+            for line in pipe:
+                line = line.rstrip('\n')
+                print(f'[{name}] {line}' if name else line)
+                if log:
+                    with log_lock:
+                        log.write(json.dumps({'time': datetime.now(timezone.utc).isoformat(), 'job': name, 'command': args[1] if len(args) > 1 else args[0], 'stream': stream_name, 'line': line}) + '\n')
+            pipe.close()
+
+        with self._semaphore:
+            started = time.monotonic()
+            timed_out = False
+            try:
+                process = subprocess.Popen(args, env=process_env, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+                readers = [threading.Thread(target=stream, args=(process.stdout, 'stdout'), daemon=True), threading.Thread(target=stream, args=(process.stderr, 'stderr'), daemon=True)]
+                for reader in readers:
+                    reader.start()
+
+                try:
+                    process.wait(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    process.terminate()
+                    try:
+                        process.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                        process.wait()
+
+                for reader in readers:
+                    reader.join()
+                returncode = process.returncode
+            except OSError as e:
+                print(f'Failed to start {args[0]}: {e}')
+                returncode = 127
+            finally:
+                if log:
+                    log.close()
+
+            duration = time.monotonic() - started
+            run_metrics.observe_process(args[1] if len(args) > 1 else os.path.basename(args[0]), duration, returncode, timed_out)
+            return ProcessResult(args, returncode, duration, timed_out)
+
+    # Run a command and retry it while it fails with a retryable status.  Raises ProcessKilledError when the
+    # process was killed by a signal, so the caller stops instead of carrying on with the next step.
+    def run_with_retries(self, args: List[str], retries: int | None = None, should_retry=is_retryable, **kwargs) -> ProcessResult:
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            result = self.run(args, **kwargs)
+            result.attempts = attempt + 1
+            if result.killed:
+                raise ProcessKilledError(result)
+            if result.succeeded or attempt == retries or not should_retry(result):
+                return result
+            print(f'{os.path.basename(args[0])} {result.describe()}, retrying in {self.retry_delay:.0f} seconds (attempt {attempt + 2} of {retries + 1})')
+            time.sleep(self.retry_delay)
+        return result
+
+# Shared runner for snyk-api-import processes
+process_runner = ProcessRunner()
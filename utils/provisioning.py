@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+
+from apis.snykApi import create_snyk_org, get_org_integrations, get_snyk_org_data
+from helpers.metrics import run_metrics
+from utils.checkpoint import CheckpointJournal, ORG_CREATED, batch_unit
+from utils.orgIndex import GroupOrgIndex
+
+DEFAULT_PROVISIONING_CONCURRENCY = 5
+DEFAULT_INTEGRATION_WAIT_SECONDS = 300
+INTEGRATION_POLL_SECONDS = 5
+
+# Pick the integration the targets of a batch are imported with
+def batch_integration_id(integrations: dict, github_cloud_app_integration: bool) -> str:
+    if github_cloud_app_integration:
+        if 'github-cloud-app' in integrations:
+            return integrations['github-cloud-app']
+        print('No github-cloud-app integration found, continuing with github-enterprise integration')
+
+    github_enterprise_id = integrations.get('github-enterprise')
+    if not github_enterprise_id:
+        raise ValueError("GitHub Enterprise integration ID not found in integrations response")
+    return github_enterprise_id
+
+def batch_count(target_count: int, batch_size: int) -> int:
+    return math.ceil(target_count / batch_size) if target_count else 0
+
+# A new org gets its integrations copied from the source org shortly after it is created, so poll until
+# the GitHub Enterprise integration shows up.  Empty answers are never cached, so every poll is a request.
+def wait_for_integration_id(org_id: str, snyk_api_tenant: str, github_cloud_app_integration: bool, timeout: float = DEFAULT_INTEGRATION_WAIT_SECONDS) -> str:
+    deadline = time.monotonic() + timeout
+    while True:
+        integrations = get_org_integrations(org_id, snyk_api_tenant)
+        if isinstance(integrations, dict) and integrations.get('github-enterprise'):
+            return batch_integration_id(integrations, github_cloud_app_integration)
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f'No GitHub Enterprise integration in org {org_id} after {timeout:.0f} seconds')
+        time.sleep(INTEGRATION_POLL_SECONDS)
+
+class BatchOrgProvisioner:
+    """
+    Makes sure the <org>-N orgs for batches 2..N of an org exist before its import files are written.
+    Missing orgs are created concurrently, through the shared rate limited client, and each org's
+    integrations are waited for, so the batch imports that follow need no Snyk API calls.
+    """
+
+    def __init__(self, snyk_api_tenant: str, group_id: str, source_org_id: str, group_org_index: GroupOrgIndex, github_cloud_app_integration: bool, journal: CheckpointJournal | None = None, concurrency: int = DEFAULT_PROVISIONING_CONCURRENCY, integration_wait_seconds: float = DEFAULT_INTEGRATION_WAIT_SECONDS):
+        self.snyk_api_tenant = snyk_api_tenant
+        self.group_id = group_id
+        self.source_org_id = source_org_id
+        self.group_org_index = group_org_index
+        self.github_cloud_app_integration = github_cloud_app_integration
+        self.journal = journal
+        self.concurrency = max(1, concurrency)
+        self.integration_wait_seconds = integration_wait_seconds
+        # One lock per <org>-N name, so GitHub orgs mapped to the same Snyk org create each batch org once
+        self._lock = threading.Lock()
+        self._batch_org_locks: Dict[str, threading.Lock] = {}
+
+    # Returns {batch number: {'orgId', 'integrationId'}} for the given batch numbers (2 and up)
+    def provision(self, org_name: str, base_org_id: str, batch_numbers: Iterable[int]) -> Dict[int, dict]:
+        batch_numbers = list(batch_numbers)
+        if not batch_numbers:
+            return {}
+
+        base_org_data = get_snyk_org_data(base_org_id, self.snyk_api_tenant)
+        base_name = base_org_data['attributes']['name']
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batch_numbers))) as executor:
+            batch_orgs = dict(zip(batch_numbers, executor.map(lambda batch_number: self.batch_org(org_name, base_org_data, base_name, batch_number), batch_numbers)))
+            org_ids = {batch_number: org_id for batch_number, (org_id, _) in batch_orgs.items()}
+            integration_ids = dict(zip(batch_numbers, executor.map(lambda batch_number: wait_for_integration_id(org_ids[batch_number], self.snyk_api_tenant, self.github_cloud_app_integration, self.integration_wait_seconds), batch_numbers)))
+
+        created = sum(1 for _, was_created in batch_orgs.values() if was_created)
+        print(f'Provisioned {len(batch_numbers)} batch orgs for {base_name} ({created} created)')
+        return {batch_number: {'orgId': org_ids[batch_number], 'integrationId': integration_ids[batch_number]} for batch_number in batch_numbers}
+
+    def batch_org_lock(self, batch_org_name: str) -> threading.Lock:
+        with self._lock:
+            return self._batch_org_locks.setdefault(batch_org_name, threading.Lock())
+
+    # Find or create the <org>-N org of one batch and record it in the journal.  Returns the org ID and
+    # whether the org was created now.
+    def batch_org(self, org_name: str, base_org_data: dict, base_name: str, batch_number: int) -> tuple[str, bool]:
+        unit = batch_unit(batch_number)
+        org_created = self.journal.details(org_name, ORG_CREATED, unit) if self.journal else None
+        if org_created:
+            return (org_created['org_id'], False)
+
+        # Callers after the first wait for its create and then find the new org in the index
+        batch_org_name = f'{base_name}-{batch_number}'
+        with self.batch_org_lock(batch_org_name):
+            org_id = self.group_org_index.find_id_by_name(batch_org_name)
+            created = org_id is None
+            if created:
+                print(f'Creating org {batch_org_name}')
+                with run_metrics.timer('org_creation', org_name):
+                    new_org_data = create_snyk_org(base_org_data, self.source_org_id, batch_number, self.group_id, self.snyk_api_tenant)
+                if not new_org_data or 'id' not in new_org_data:
+                    raise RuntimeError(f'Could not create org {batch_org_name}')
+                org_id = new_org_data['id']
+                self.group_org_index.add_created_org(new_org_data)
+
+        if self.journal:
+            self.journal.record(org_name, ORG_CREATED, unit, org_id=org_id)
+        return (org_id, created)
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+from utils.importTargets import BatchFileWriter, iter_import_targets
+
+# The shard of a row comes from a hash of its Snyk org ID (or its Snyk-Org-Name when the org does not
+# exist), not Python's hash() which is seeded per process, so every node puts a row in the same shard.
+# GitHub orgs mapped to the same Snyk org land in one shard, so only one node creates its <org>-N orgs.
+def shard_of(snyk_org_key: str, shard_count: int) -> int:
+    digest = hashlib.sha256(snyk_org_key.strip().lower().encode()).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+# Give a file a shard's own name, snyk-import-results.json becomes snyk-import-results.shard-0-of-4.json.
+# Files of an unsharded run keep their names.
+def shard_path(path: str, shard_index: int, shard_count: int) -> str:
+    if shard_count <= 1:
+        return path
+    root, extension = os.path.splitext(path)
+    return f'{root}.shard-{shard_index}-of-{shard_count}{extension}'
+
+def shard_paths(path: str, shard_count: int) -> List[str]:
+    return [shard_path(path, shard_index, shard_count) for shard_index in range(shard_count)]
+
+# Combine the result summaries of the shards into one summary in the same format.  Shards hold disjoint
+# Snyk orgs, and so disjoint GitHub orgs, but counts are added up so overlapping summaries still add up.
+def merge_results(results_files: Iterable[str], merged_results_file: str) -> dict:
+    orgs = {}
+    totals = Counter()
+    shards = []
+    for results_file in results_files:
+        with open(results_file, 'r') as file:
+            summary = json.load(file)
+        shards.append({'file': os.path.abspath(results_file), 'generated': summary.get('generated'), 'totals': summary.get('totals', {})})
+        for github_org_name, org_results in summary.get('orgs', {}).items():
+            for org_id, result in org_results.items():
+                merged = orgs.setdefault(github_org_name, {}).setdefault(org_id, {'imported': 0, 'failed': 0, 'errors': {}})
+                merged['imported'] += result.get('imported', 0)
+                merged['failed'] += result.get('failed', 0)
+                merged['errors'] = dict(Counter(merged['errors']) + Counter(result.get('errors', {})))
+                totals['imported'] += result.get('imported', 0)
+                totals['failed'] += result.get('failed', 0)
+
+    merged_summary = {
+        'generated': datetime.now(timezone.utc).isoformat(),
+        'totals': {'imported': totals['imported'], 'failed': totals['failed']},
+        'shards': shards,
+        'orgs': {github_org_name: orgs[github_org_name] for github_org_name in sorted(orgs)},
+    }
+    with open(merged_results_file, 'w') as file:
+        json.dump(merged_summary, file, indent=4)
+    return merged_summary
+
+# Stream the failed targets of every shard into one import file.  Returns the number of targets written.
+def merge_failed_targets(failed_targets_files: Iterable[str], merged_failed_targets_file: str) -> int:
+    writer = BatchFileWriter(merged_failed_targets_file)
+    for failed_targets_file in failed_targets_files:
+        for import_target in iter_import_targets(failed_targets_file):
+            writer.write(import_target)
+    writer.close()
+    return writer.count
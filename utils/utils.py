@@ -1,31 +1,22 @@
-import csv
 import json
-import shutil
-from typing import List, Dict
-import typer
-from datetime import date
-import subprocess
+from typing import Dict, Iterable, List
 import os
-
-from apis.snykApi import create_snyk_org, get_snyk_org_data, get_snyk_orgs, get_org_integrations
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from apis.snykApi import get_snyk_orgs, get_org_integrations, snyk_base_url
+from helpers.metrics import run_metrics
+from utils.archive import RunArchive
+from utils.batching import DEFAULT_BATCH_SIZE, count_import_targets, resolve_batch_size, throughput_tracker
+from utils.importTargets import stream_split_import_targets
+from utils.incremental import IncrementalFilter, related_org_ids
+from utils.orgIndex import GroupOrgIndex
+from utils.processRunner import ProcessResult, process_runner
+from utils.provisioning import DEFAULT_INTEGRATION_WAIT_SECONDS, DEFAULT_PROVISIONING_CONCURRENCY, BatchOrgProvisioner, batch_count
+from utils.checkpoint import CheckpointJournal, GENERATED, IMPORTED, SPLIT, batch_unit
+from utils.workspace import JobWorkspace, batch_file_name
 
 current_directory = os.getcwd()
 
-def read_csv_file(csv_file_path: str) -> List[Dict[str, str]]:
-    """
-    Read the CSV file and return its contents as a list of dictionaries.
-    """
-    try:
-        with open(csv_file_path, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            return list(csv_reader)
-    except FileNotFoundError:
-        typer.echo(f"Error: Could not find CSV file at {csv_file_path}")
-        raise typer.Exit(code=1)
-    except Exception as e:
-        typer.echo(f"Error reading CSV file: {str(e)}")
-        raise typer.Exit(code=1) 
-    
 def read_json_file(json_file_path: str) -> List[Dict[str, str]]:
     try:
         with open(json_file_path, 'r') as file:
@@ -33,250 +24,224 @@ def read_json_file(json_file_path: str) -> List[Dict[str, str]]:
     except:
         print('Failed to read json file.')
 
-def write_json_file(json_file_path: str, data: dict) -> None:
-    try:
-        with open(json_file_path, 'w') as file:
-            json.dump(data, file, indent=4)
-    except:
-        print('Failed to write json file.')
-    
-# Write snyk-created-orgs.json file
-def writeJsonFile(orgDataObject, index):
-    fileName = f'snyk-created-orgs-{index}.json'
+# Write a job's snyk-created-orgs.json file
+def writeJsonFile(orgDataObject, fileName):
     try:
         with open(fileName, 'w') as json_file:
             json.dump(orgDataObject, json_file, indent=4)
     except:
         print('Failed to create json file.')
-        
-def find_org_data_files():
-    org_data_files_path = []
-    org_data_file_name = 'snyk-created-orgs-'
-    matching_files = [f for f in os.listdir(current_directory) if f.startswith(org_data_file_name)]
-
-    # print("Files that start with '{}':".format(org_data_file_name))
-    for file in matching_files:
-        file_path = current_directory + '/' + file
-        org_data_files_path.append(file_path)
-    return org_data_files_path
 
-def find_log_files():
-    log_files = [f for f in os.listdir(current_directory) if f.endswith('.log')]
-    log_file_data = []
-    for file in log_files:
-        file_path = current_directory + '/' + file
-        log_file_data.append(file_path)
-    return log_file_data
-
-# Split large import data file into smaller batches and return list of new file paths.
-def split_import_data_file(file_path: str, batch_size: int = 1000) -> tuple[List[str], str | None]:
+# Split large import data file into smaller batches and return list of new file paths.  Targets are
+# streamed from the file and written to compact batch files as they are read, so memory stays flat
+# however many repos the org has.  batch_ids supplies each batch's final orgId/integrationId so the
+# batch files are written once, ready to import.  Targets target_filter rejects are left out, and no
+# files are returned when none are left.  The orgId is only returned when the file was split.  Returns
+# None when the file could not be split.
+def split_import_data_file(file_path: str, batch_size: int = DEFAULT_BATCH_SIZE, batch_ids=None, target_filter=None) -> tuple[List[str], str | None] | None:
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            
-        targets = data['targets']
-        if len(targets) <= batch_size:
+        # Batch files go next to the import data file
+        batch_directory = os.path.dirname(file_path)
+        batched_files, first_target = stream_split_import_targets(file_path, batch_size, lambda batch_number: os.path.join(batch_directory, batch_file_name(batch_number)), batch_ids, target_filter)
+        if not batched_files:
+            if first_target is None and target_filter is not None:
+                return ([], None)
             return ([file_path], None)
-            
-        # Split targets into batches
-        batched_files = []
-        for i in range(0, len(targets), batch_size):
-            batch = targets[i:i + batch_size]
-            batch_file_name = f'github-enterprise-import-targets-batch-{i//batch_size + 1}.json'
-            batch_data = {'targets': batch}
-            
-            with open(batch_file_name, 'w') as f:
-                json.dump(batch_data, f, indent=2)
-            batched_files.append(os.path.join(current_directory, batch_file_name))
+        if len(batched_files) == 1:
+            return (batched_files, None)
         
         # Get the orgId from first target in first batch for reference
-        org_id = targets[0]['orgId']
+        org_id = first_target['orgId']
         print(f'Here is the orgId in split_import_data_file method: {org_id}')
         return (batched_files, org_id)
         
     except Exception as e:
         print(f'Error splitting import data file: {str(e)}')
-        return ([], None)
-
-def find_import_data_file():
-    import_data_file_name = 'github-enterprise-import-targets.json'
-    matching_file = [f for f in os.listdir(current_directory) if f.startswith(import_data_file_name)]
-    print(f'Here is the length of the import file list: {len(matching_file)}')
-    if len(matching_file) >= 1:
-        matching_file = current_directory + '/' + matching_file[0]
-        return matching_file
-    else:
         return None
-    
-def find_matching_org_id(org_data: dict, group_org_data: list, index: int) -> str | None:
-    org_name = org_data['attributes']['name']
-    indexed_name = f"{org_name}-{index}"
-    
-    for group_org in group_org_data:
-        if group_org['attributes']['name'] == indexed_name:
-            return group_org['id']
-    
-    return None   
 
-def import_repos(org_data_files_path, snyk_api_import_name, snyk_api_tenant, group_id, source_org_id, github_cloud_app_integration):
-    group_org_data = get_snyk_orgs(group_id, snyk_api_tenant)
-    for org_data_file_path in org_data_files_path:
-        print(org_data_file_path)
-        org_data_value = f'--orgsData={org_data_file_path}'
+# Run snyk-api-import with an argument list through the shared process runner.  SNYK_LOG_PATH points at
+# the job workspace so generated import files and logs from concurrent jobs never collide.
+def run_snyk_api_import(workspace: JobWorkspace, snyk_api_import_name, snyk_api_tenant, *arguments) -> ProcessResult:
+    args = [os.path.join(current_directory, snyk_api_import_name), *arguments]
+    env = {'SNYK_API': f'{snyk_base_url(snyk_api_tenant)}/v1', 'SNYK_LOG_PATH': workspace.path}
+    return process_runner.run_with_retries(args, env=env, cwd=workspace.path, log_file=workspace.process_log_file, name=workspace.name)
+
+# Run snyk-api-import import:data for a job's org data file, timed as the import_data phase
+def generate_import_data(workspace: JobWorkspace, snyk_api_import_name, snyk_api_tenant) -> ProcessResult:
+    with run_metrics.timer('import_data', workspace.github_org_name):
+        return run_snyk_api_import(workspace, snyk_api_import_name, snyk_api_tenant, 'import:data', f'--orgsData={workspace.org_data_file}', '--source=github-enterprise', '--integrationType=github-enterprise')
+
+# Build the batch_ids callback for split_import_data_file.  Batch 1 stays in the org the targets were
+# generated for and only swaps to the github-cloud-app integration when asked to.  Batch N goes into the
+# <org>-N org provisioned before the split; a batch that was not provisioned gets its org on the spot.
+def batch_id_resolver(org_name, snyk_api_tenant, provisioner: BatchOrgProvisioner, provisioned_batches: Dict[int, dict], github_cloud_app_integration):
+    def resolve(batch_number, first_target):
+        if batch_number == 1:
+            if not github_cloud_app_integration:
+                return None
+            print('Using github-cloud-app integration')
+            integrations = get_org_integrations(first_target['orgId'], snyk_api_tenant)
+            if 'github-cloud-app' not in integrations:
+                print('No github-cloud-app integration found, continuing with github-enterprise integration')
+                return None
+            print(f"Updating targets with new integration ID: {integrations['github-cloud-app']}")
+            return {'integrationId': integrations['github-cloud-app']}
+
+        if batch_number not in provisioned_batches:
+            provisioned_batches.update(provisioner.provision(org_name, first_target['orgId'], [batch_number]))
+        print(f"Adding orgId {provisioned_batches[batch_number]['orgId']} to batch file number: {batch_number}")
+        return provisioned_batches[batch_number]
+
+    return resolve
+
+# Run snyk-api-import import for one file and record it in the journal when it succeeded
+def run_import(workspace: JobWorkspace, import_file_path, snyk_api_import_name, snyk_api_tenant, journal: CheckpointJournal | None, unit: str) -> bool:
+    with run_metrics.timer('batch_import', workspace.github_org_name):
+        result = run_snyk_api_import(workspace, snyk_api_import_name, snyk_api_tenant, 'import', f'--file={import_file_path}')
+    if not result.succeeded:
+        print(f'snyk-api-import import {result.describe()} for {import_file_path}')
+        return False
+    # Feed the measured throughput into the automatic batch size
+    throughput_tracker.record(count_import_targets(import_file_path), result.duration)
+    if journal:
+        journal.record(workspace.github_org_name, IMPORTED, unit, file=import_file_path)
+    return True
+
+# Generate, split and import one org's repos.  Returns False when any batch failed to import.
+def import_org_repos(workspace: JobWorkspace, snyk_api_import_name, snyk_api_tenant, group_id, source_org_id, group_org_index: GroupOrgIndex, github_cloud_app_integration, journal: CheckpointJournal | None = None, batch_size: int | str = DEFAULT_BATCH_SIZE, incremental: bool = False, provisioner: BatchOrgProvisioner | None = None, max_parallel_batches: int = 1) -> bool:
+    org_name = workspace.github_org_name
+    if provisioner is None:
+        provisioner = BatchOrgProvisioner(snyk_api_tenant, group_id, source_org_id, group_org_index, github_cloud_app_integration, journal)
+
+    if journal and journal.has(org_name, IMPORTED):
+        print(f'Skipping {org_name}, already imported')
+        return True
+
+    # Reuse the import data generated by an earlier run when resuming
+    generated = journal.details(org_name, GENERATED) if journal else None
+    resumed = generated is not None and os.path.isfile(generated['import_targets_file'])
+    if resumed:
+        import_file_path = generated['import_targets_file']
+        print(f'Resuming {org_name} with generated import data {import_file_path}')
+    else:
+        print(workspace.org_data_file)
         # Run snyk-api-import import:data command
-        subprocess.run(f'SNYK_API=https:/{snyk_api_tenant}/v1 {current_directory}/{snyk_api_import_name} import:data {org_data_value} --source=github-enterprise --integrationType=github-enterprise', shell=True)
-        
-        # Find and split import data file if needed
-        import_file_path = find_import_data_file()
-        if import_file_path:
-            import_files = split_import_data_file(import_file_path)
-            print(f'Here is the import files: {import_files}')
-            
-            if import_files[1] != None:
-                org_data = get_snyk_org_data(import_files[1], snyk_api_tenant)              
-                
-                # Process each batch file
-                for index, batch_file in enumerate(import_files[0]):
-                    # Check if github-cloud-app integration is used
-                    if github_cloud_app_integration:
-                        print('Using github-cloud-app integration')
-                        import_data = read_json_file(batch_file)
-                        org_id = import_data['targets'][0]['orgId']
-                        integrations = get_org_integrations(org_id, snyk_api_tenant)
-                        if 'github-cloud-app' in integrations:
-                            github_integration_id = integrations['github-cloud-app']
-                            for import_target in import_data['targets']:
-                                import_target['integrationId'] = github_integration_id    
-                            write_json_file(batch_file, import_data)
-                            print(f"Updated {len(import_data['targets'])} targets with new integration ID: {github_integration_id}") 
-                        else:
-                            print('No github-cloud-app integration found, continuing with github-enterprise integration')
-
-                    print(f'Processing batch file number: {index}.  File name: {batch_file}')
-                    if index > 0:
-                        matching_org_id = find_matching_org_id(org_data, group_org_data, index + 1)
-                        if matching_org_id == None:
-                            print(f'No matching orgId found for {org_data["attributes"]["name"]} - {index + 1} \n Creating new org...')
-                            # Create new org and get orgId.  Then add orgId to batch file and import
-                            new_org_data = create_snyk_org(org_data, source_org_id, index + 1, group_id, snyk_api_tenant)
-                            matching_org_id = new_org_data['id']
-                            
-                            print(f'Adding new orgId {matching_org_id} to batch file {batch_file}')
-                            # subprocess.run(f'DEBUG=* SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={batch_file}', shell=True)
-                            integrations = get_org_integrations(matching_org_id, snyk_api_tenant)
-                            update_batch_file_ids(batch_file, matching_org_id, integrations)
-                            subprocess.run(f'SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={batch_file}', shell=True)
-                        else:
-                            # Add orgId to batch file and import
-                            print(f'Found matching orgId {matching_org_id} for {org_data["attributes"]["name"]} - {index + 1} \n Adding orgId to batch file {batch_file}')
-                            integrations = get_org_integrations(matching_org_id, snyk_api_tenant)
-                            # subprocess.run(f'DEBUG=* SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={batch_file}', shell=True)
-                            update_batch_file_ids(batch_file, matching_org_id, integrations)
-                            subprocess.run(f'SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={batch_file}', shell=True)
-            else:
-                print(f'Importing data file {import_file_path}')
-                # subprocess.run(f'DEBUG=* SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={batch_file}', shell=True)
-                if github_cloud_app_integration:
-                        print('Using github-cloud-app integration')
-                        import_data = read_json_file(import_file_path)
-                        org_id = import_data['targets'][0]['orgId']
-                        integrations = get_org_integrations(org_id, snyk_api_tenant)
-                        if 'github-cloud-app' in integrations:
-                            github_integration_id = integrations['github-cloud-app']
-                            for import_target in import_data['targets']:
-                                import_target['integrationId'] = github_integration_id    
-                            write_json_file(import_file_path, import_data)
-                            print(f"Updated {len(import_data['targets'])} targets with new integration ID: {github_integration_id}") 
-                        else:
-                            print('No github-cloud-app integration found, continuing with github-enterprise integration')
-
-                subprocess.run(f'SNYK_API=https:/{snyk_api_tenant}/v1  {current_directory}/{snyk_api_import_name} import --file={import_file_path}', shell=True)
-                    
-        else:
+        result = generate_import_data(workspace, snyk_api_import_name, snyk_api_tenant)
+        if not result.succeeded:
+            print(f'snyk-api-import import:data {result.describe()} for {org_name}')
+            return False
+        if not workspace.has_import_targets_file():
             print('No import file found.')
-
-def clean_up(list_of_files, switch):
-    today_date = date.today()
-    formatted_date = today_date.strftime("%m%d%Y")
+            return True
+        import_file_path = workspace.import_targets_file
+        if journal:
+            journal.record(org_name, GENERATED, import_targets_file=import_file_path)
+
+    # Split import data file if needed.  Batch files come out with their final orgId and integrationId.
+    # In incremental mode only the targets that are not in Snyk yet go into the batch files.
+    target_filter = None
+    split = journal.details(org_name, SPLIT) if journal else None
+    if split and resumed and all(os.path.isfile(f) for f in split['batch_files']):
+        import_files = (split['batch_files'], split['org_id'])
+    else:
+        org_id = read_json_file(workspace.org_data_file)['orgData'][0]['orgId']
+        if incremental:
+            with run_metrics.timer('existing_targets', org_name):
+                target_filter = IncrementalFilter(related_org_ids(org_id, snyk_api_tenant, group_org_index), snyk_api_tenant)
+
+        # Count the targets to know how many batches there will be, then find or create the <org>-N orgs
+        # of batches 2..N together before any batch file is written
+        target_count = count_import_targets(import_file_path, target_filter)
+        org_batch_size = resolve_batch_size(workspace.batch_size or batch_size, import_file_path, target_filter, target_count)
+        with run_metrics.timer('org_provisioning', org_name):
+            provisioned_batches = provisioner.provision(org_name, org_id, range(2, batch_count(target_count, org_batch_size) + 1))
+
+        batch_ids = batch_id_resolver(org_name, snyk_api_tenant, provisioner, provisioned_batches, github_cloud_app_integration)
+        with run_metrics.timer('split', org_name):
+            import_files = split_import_data_file(import_file_path, org_batch_size, batch_ids, target_filter)
+        if import_files is None:
+            return False
+        if target_filter is not None:
+            print(f'Incremental import for {org_name}: {target_filter.describe()}')
+        if journal:
+            journal.record(org_name, SPLIT, batch_files=import_files[0], org_id=import_files[1])
+    workspace.batch_files = [f for f in import_files[0] if f != import_file_path]
+    print(f'Here is the import files: {import_files}')
     
-    # Define folder names based on switch value
-    match switch:
-        case "json":
-            folder_name = f'json-files-dir-{formatted_date}'
-        case "log":
-            folder_name = f'log-files-dir-{formatted_date}'
-        case "import":
-            folder_name = f'import-files-dir-{formatted_date}'
-        case _:
-            print("Invalid switch value")
-            return
-
-    file_name_counter = 2
-    making_directory = True
-
-    # Create the new directory
-    while making_directory:
-        if os.path.exists(current_directory + '/' + folder_name):
+    # Import each batch file.  Their orgs already exist, so batches run back to back, or side by side
+    # with max_parallel_batches, without API calls in between.
+    pending_batches = []
+    for index, batch_file in enumerate(import_files[0]):
+        unit = batch_unit(index + 1)
+        if journal and journal.has(org_name, IMPORTED, unit):
+            print(f'Skipping batch file number: {index}, already imported')
+            continue
+        pending_batches.append((index, batch_file, unit))
+
+    def import_batch(pending_batch):
+        index, batch_file, unit = pending_batch
+        print(f'Processing batch file number: {index}.  File name: {batch_file}')
+        return run_import(workspace, batch_file, snyk_api_import_name, snyk_api_tenant, journal, unit)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_batches, len(pending_batches) or 1))) as executor:
+        all_imported = all(list(executor.map(import_batch, pending_batches)))
+
+    if target_filter is not None and import_files[0]:
+        target_filter.invalidate()
+    if journal and all_imported:
+        journal.record(org_name, IMPORTED)
+    return all_imported
+
+# Run the per-org import pipeline for every job workspace with a bounded pool of workers.  Workspaces
+# are consumed as they are produced, so the first orgs start importing while later ones are still being
+# prepared.  A failure in one org is reported without stopping the others.  Returns the workspaces whose
+# import failed or did not complete.
+def import_repos(workspaces: Iterable[JobWorkspace], snyk_api_import_name, snyk_api_tenant, group_id, source_org_id, github_cloud_app_integration, max_parallel_orgs: int = 1, journal: CheckpointJournal | None = None, batch_size: int | str = DEFAULT_BATCH_SIZE, group_org_index: GroupOrgIndex | None = None, incremental: bool = False, provisioning_concurrency: int = DEFAULT_PROVISIONING_CONCURRENCY, integration_wait_seconds: float = DEFAULT_INTEGRATION_WAIT_SECONDS, max_parallel_batches: int = 1) -> List[JobWorkspace]:
+    if group_org_index is None:
+        group_org_index = GroupOrgIndex(get_snyk_orgs(group_id, snyk_api_tenant))
+    provisioner = BatchOrgProvisioner(snyk_api_tenant, group_id, source_org_id, group_org_index, github_cloud_app_integration, journal, provisioning_concurrency, integration_wait_seconds)
+    max_parallel_orgs = max(1, max_parallel_orgs)
+    failed_workspaces = []
+    pending = {}
+    job_count = 0
+
+    def collect(done_futures):
+        for future in done_futures:
+            workspace = pending.pop(future)
             try:
-                os.makedirs(current_directory + '/' + folder_name + '-run#' + str(file_name_counter))
-                new_dir_path = current_directory + '/' + folder_name + '-run#' + str(file_name_counter)
-                making_directory = False
-            except:
-                file_name_counter = file_name_counter + 1
-        else:
-            os.makedirs(current_directory + '/' + folder_name)
-            new_dir_path = current_directory + '/' + folder_name
-            making_directory = False
-
-    # Move files to the new directory
-    for file in list_of_files:
-        # Check if the file exists
-        if os.path.isfile(file):
-            # Strip out file name
-            split = file.split('/')
-            file_name = split[(len(split)-1)]
-            # Move the file
-            shutil.move(file, os.path.join(new_dir_path, file_name))
-        else:
-            print(f"File {file} does not exist")
-
-def find_batch_import_data_files():
-    """Find all GitHub Enterprise import target files in the current directory."""
-    import_data_file_name = 'github-enterprise-import-targets'
-    matching_files = [os.path.join(current_directory, f) for f in os.listdir(current_directory) 
-                     if f.startswith(import_data_file_name) and f.endswith('.json')]
-    
-    if not matching_files:
-        print('No import files found')
-        return []
-        
-    return matching_files
-
-
-def update_batch_file_ids(batch_file_path: str, org_id: str, integrations: dict) -> None:
-    # Get GitHub Enterprise integration ID
-    github_enterprise_id = integrations.get('github-enterprise')
-    if not github_enterprise_id:
-        raise ValueError("GitHub Enterprise integration ID not found in integrations response")
-
-    try:
-        with open(batch_file_path, 'r') as file:
-            data = json.load(file)
-        
-        if not isinstance(data, dict) or 'targets' not in data:
-            raise ValueError("Invalid batch file format: missing 'targets' key")
-
-        # Update both orgId and integrationId for all targets
-        for target in data['targets']:
-            target['orgId'] = org_id
-            target['integrationId'] = github_enterprise_id
-
-        with open(batch_file_path, 'w') as file:
-            json.dump(data, file, indent=2)
-            
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON in batch file: {str(e)}")
-    except IOError as e:
-        raise IOError(f"Error accessing batch file: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Unexpected error updating batch file: {str(e)}")
+                if not future.result():
+                    failed_workspaces.append(workspace)
+            except Exception as e:
+                print(f'Import failed for {workspace.github_org_name}: {str(e)}')
+                failed_workspaces.append(workspace)
+
+    def import_org(workspace):
+        with run_metrics.timer('org_import', workspace.github_org_name):
+            return import_org_repos(workspace, snyk_api_import_name, snyk_api_tenant, group_id, source_org_id, group_org_index, github_cloud_app_integration, journal, batch_size, incremental, provisioner, max_parallel_batches)
+
+    with ThreadPoolExecutor(max_workers=max_parallel_orgs) as executor:
+        for workspace in workspaces:
+            # Don't pull more workspaces than the workers can pick up
+            while len(pending) >= max_parallel_orgs:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(import_org, workspace)
+            pending[future] = workspace
+            job_count += 1
+
+        collect(wait(pending).done)
+
+    if failed_workspaces:
+        print(f'{len(failed_workspaces)} of {job_count} org imports failed: {[w.github_org_name for w in failed_workspaces]}')
+
+    return failed_workspaces
+
+# Archive a run's files and remove them.  files_by_kind maps a kind (json, log or import) to its files.
+# Every run becomes one compressed archive with a manifest, import files are stored once per content hash,
+# and runs older than the archive's retention are pruned.
+def clean_up(files_by_kind: Dict[str, List[str]], base_directory: str = current_directory, archive: RunArchive | None = None) -> str | None:
+    if archive is None:
+        archive = RunArchive()
+    archive_path = archive.add_run(files_by_kind, base_directory)
+    archive.prune()
+    return archive_path
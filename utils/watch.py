@@ -0,0 +1,91 @@
+import json
+import os
+from typing import Dict, Iterable, List
+
+from helpers.helper import file_sha256
+from utils.csvMappings import iter_csv_mappings
+
+class CsvWatcher:
+    """
+    Tracks which rows of the mapping CSV have been imported.  A change is noticed from the file's mtime
+    and size and confirmed with its hash, and a row-level diff against the rows imported so far gives the
+    rows that were added or changed.  The imported rows are kept in a state file, so a restarted watch
+    does not import everything again.
+    """
+
+    def __init__(self, csv_file_path: str, state_file: str):
+        self.csv_file_path = csv_file_path
+        self.state_file = state_file
+        self.file_signature = None
+        self.sha256 = None
+        # GitHub org name -> Snyk org name of every row imported so far
+        self.imported_rows: Dict[str, str] = {}
+        # GitHub org name -> Snyk org name of the rows whose import started and did not finish yet
+        self.started_rows: Dict[str, str] = {}
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.state_file, 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return
+        self.imported_rows = state.get('imported_rows', {})
+        self.started_rows = state.get('started_rows', {})
+
+    def save(self) -> None:
+        temporary_path = f'{self.state_file}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'csv_sha256': self.sha256, 'imported_rows': self.imported_rows, 'started_rows': self.started_rows}, file, indent=4)
+        os.replace(temporary_path, self.state_file)
+
+    # True when the CSV file differs from the last time it was read.  The hash is only computed when the
+    # mtime or size moved, so polling an unchanged file is a single stat call.
+    def changed(self) -> bool:
+        stat = os.stat(self.csv_file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.file_signature:
+            return False
+        self.file_signature = signature
+        sha256 = file_sha256(self.csv_file_path)
+        if sha256 == self.sha256:
+            return False
+        self.sha256 = sha256
+        return True
+
+    # The CSV mappings that were added or whose Snyk org changed since they were last imported
+    def pending_mappings(self) -> List[dict]:
+        pending = []
+        current_rows = set()
+        for mapping in iter_csv_mappings(self.csv_file_path):
+            current_rows.add(mapping['github_org_name'])
+            if self.imported_rows.get(mapping['github_org_name']) != mapping['snyk_org_name']:
+                pending.append(mapping)
+
+        removed_rows = [github_org_name for github_org_name in self.imported_rows if github_org_name not in current_rows]
+        if removed_rows:
+            # Imported projects are left in Snyk, the rows are only forgotten
+            print(f"{len(removed_rows)} rows were removed from the CSV file: {', '.join(removed_rows)}")
+            for github_org_name in removed_rows:
+                del self.imported_rows[github_org_name]
+                self.started_rows.pop(github_org_name, None)
+            self.save()
+        return pending
+
+    # Record that the import of mappings is starting.  Returns the mappings whose earlier unfinished import
+    # was for another Snyk org, so the progress journaled for it can be dropped.
+    def mark_started(self, mappings: Iterable[dict]) -> List[dict]:
+        remapped = []
+        for mapping in mappings:
+            started_snyk_org_name = self.started_rows.get(mapping['github_org_name'])
+            if started_snyk_org_name is not None and started_snyk_org_name != mapping['snyk_org_name']:
+                remapped.append(mapping)
+            self.started_rows[mapping['github_org_name']] = mapping['snyk_org_name']
+        self.save()
+        return remapped
+
+    def mark_imported(self, mappings: Iterable[dict]) -> None:
+        for mapping in mappings:
+            self.imported_rows[mapping['github_org_name']] = mapping['snyk_org_name']
+            self.started_rows.pop(mapping['github_org_name'], None)
+        self.save()
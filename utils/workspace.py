@@ -0,0 +1,65 @@
+import os
+import re
+import shutil
+import tempfile
+from typing import List
+
+ORG_DATA_FILE_NAME = 'snyk-created-orgs.json'
+IMPORT_TARGETS_FILE_NAME = 'github-enterprise-import-targets.json'
+PROCESS_LOG_FILE_NAME = 'snyk-api-import-output.log.jsonl'
+
+def workspace_name(github_org_name: str) -> str:
+    return 'job-' + re.sub(r'[^\w.-]', '_', github_org_name)
+
+def batch_file_name(batch_number: int) -> str:
+    return f'github-enterprise-import-targets-batch-{batch_number}.json'
+
+# Create the directory that holds the workspaces of a run.  Without a path this is a fresh temp
+# directory; with one the directory is kept between runs so a resumed run finds its files again.
+def create_run_directory(path: str | None = None, prefix: str = 'snyk-import-run-') -> str:
+    if path is None:
+        return tempfile.mkdtemp(prefix=prefix)
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class JobWorkspace:
+    """
+    Directory owned by a single org import job.  Every file the job produces lives at a known path
+    inside it, so steps hand paths to each other instead of scanning the working directory.  The
+    directory is named after the org only, so a resumed run reopens the one its journal points at.
+    """
+
+    def __init__(self, run_directory: str, github_org_name: str):
+        self.name = workspace_name(github_org_name)
+        self.github_org_name = github_org_name
+        self.path = os.path.join(run_directory, self.name)
+        os.makedirs(self.path, exist_ok=True)
+
+        self.org_data_file = os.path.join(self.path, ORG_DATA_FILE_NAME)
+        self.import_targets_file = os.path.join(self.path, IMPORT_TARGETS_FILE_NAME)
+        # stdout and stderr of every snyk-api-import process run for this job, one JSON object per line
+        self.process_log_file = os.path.join(self.path, PROCESS_LOG_FILE_NAME)
+        self.batch_files: List[str] = []
+        # Batch size an import plan fixed for this org, used instead of --batch-size
+        self.batch_size: int | None = None
+
+    def has_import_targets_file(self) -> bool:
+        return os.path.isfile(self.import_targets_file)
+
+    def import_files(self) -> List[str]:
+        files = [self.import_targets_file] + self.batch_files
+        return [f for f in files if os.path.isfile(f)]
+
+    # snyk-api-import names its log files after the org, so these are the only files listed rather than known
+    def log_files(self) -> List[str]:
+        return [os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.log') or f == PROCESS_LOG_FILE_NAME]
+
+    def remove(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+# Reopen the workspace an earlier, interrupted run left for an org, or None when it is gone
+def existing_workspace(run_directory: str, github_org_name: str) -> JobWorkspace | None:
+    if not os.path.isdir(os.path.join(run_directory, workspace_name(github_org_name))):
+        return None
+    return JobWorkspace(run_directory, github_org_name)